@@ -0,0 +1,110 @@
+#benchmark: old float64 resize_image vs the uint8 grayscale paths - peak RSS and time per page
+#usage: python benchmark_resize_image.py [pdf_path] [dim]
+import os
+import sys
+import time
+import resource
+import tempfile
+from multiprocessing import get_context
+
+import fitz  # PyMuPDF for PDF processing
+import numpy as np
+import cv2
+from PIL import Image
+
+from page_rasterizer import render_page, pixmap_to_array
+from image_preprocessing import resize_image
+
+
+# === The resize_image that was copy-pasted into the scripts (kept here as the baseline) ===
+def legacy_resize_image(image, dim=768, save_path=None):
+    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
+    original_size = image1.shape  # (height, width, channels)
+    image1 = image1.mean(axis=2)  # Convert image to grayscale
+    h, w = image1.shape
+    if w > h:
+        new_w = dim
+        new_h = int(h * (dim / w))
+    else:
+        new_h = dim
+        new_w = int(w * (dim / h))
+    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    resized_image_pil = Image.fromarray(resized_image)
+    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
+    if save_path:
+        resized_image_pil.save(save_path)
+    return original_size, (new_h, new_w), resized_image_pil
+
+
+# === Variants: render + resize one page ===
+def legacy(page, dim):
+    pix = render_page(page, dpi=300)
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    return legacy_resize_image(image, dim=dim)
+
+
+def rgb_300_cvtcolor(page, dim):
+    pix = render_page(page, dpi=300)
+    return resize_image(pixmap_to_array(pix), dim=dim)
+
+
+def gray_300(page, dim):
+    pix = render_page(page, dpi=300, gray=True)
+    return resize_image(pixmap_to_array(pix), dim=dim)
+
+
+def gray_at_dim(page, dim):
+    pix = render_page(page, dim=dim, gray=True)
+    return resize_image(pixmap_to_array(pix), dim=dim)
+
+
+variants = {
+    "legacy (RGB 300dpi, float64 mean)": legacy,
+    "RGB 300dpi, uint8 cvtColor": rgb_300_cvtcolor,
+    "csGRAY 300dpi, uint8 resize": gray_300,
+    "csGRAY rendered at dim": gray_at_dim,
+}
+
+
+def _maxrss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024  # bytes on macOS, KB on Linux
+
+
+# === Run one variant in a fresh process so peak RSS isn't shared between variants ===
+def _run_variant(name, pdf_path, dim):
+    doc = fitz.open(pdf_path)
+    baseline = _maxrss_mb()
+    start_time = time.perf_counter()
+    for i in range(doc.page_count):
+        variants[name](doc.load_page(i), dim)
+    seconds = time.perf_counter() - start_time
+    return {"pages": doc.page_count, "seconds": seconds, "peak_rss_mb": _maxrss_mb() - baseline}
+
+
+# === Synthetic A4 answer sheet when no PDF is given ===
+def make_sample_pdf(path, num_pages=5):
+    doc = fitz.open()
+    for p in range(num_pages):
+        page = doc.new_page()
+        for line in range(40):
+            page.insert_text((50, 60 + line * 18), f"Q{p + 1}.{line} v = u + at, s = ut + 1/2 at^2, F = ma", fontsize=11)
+    doc.save(path)
+
+
+def main(pdf_path=None, dim=768):
+    if pdf_path is None:
+        pdf_path = os.path.join(tempfile.mkdtemp(), "sample.pdf")
+        make_sample_pdf(pdf_path)
+
+    ctx = get_context("spawn")
+    print(f"📄 {pdf_path} at dim={dim}")
+    print(f"{'variant':<38}{'ms/page':>10}{'peak RSS (MB)':>16}")
+    for name in variants:
+        with ctx.Pool(1) as pool:
+            r = pool.apply(_run_variant, (name, pdf_path, dim))
+        print(f"{name:<38}{1000 * r['seconds'] / r['pages']:>10.1f}{r['peak_rss_mb']:>16.1f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None, int(sys.argv[2]) if len(sys.argv) > 2 else 768)
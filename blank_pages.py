@@ -0,0 +1,55 @@
+#blank / near-empty page detection on the downscaled grayscale page, so those pages are never sent to gemini
+import numpy as np
+import cv2
+
+# === Thresholds (tuned on 768px grayscale pages) ===
+ink_threshold = 160  # pixels darker than this count as ink
+min_ink_ratio = 0.00002  # below this fraction of ink pixels the page is blank (a lone "x = 5" is ~0.00015)
+min_std = 0.5  # a uniform page is blank whatever the other signals say
+faint_ink_ratio = 0.0002  # pages with less ink than this are blank unless some of it is a real stroke
+min_component_area = 12  # px, smaller blobs are scan noise / dust specks
+
+
+# === Cheap signals for one grayscale (uint8, 2D) page ===
+def blank_page_stats(gray):
+    ink = (gray < ink_threshold).astype(np.uint8)
+    ink_ratio = float(ink.mean())
+    std = float(gray.std())
+    components = 0
+    if min_ink_ratio <= ink_ratio < faint_ink_ratio:
+        num, _, stats, _ = cv2.connectedComponentsWithStats(ink, connectivity=8)
+        components = int(np.count_nonzero(stats[1:, cv2.CC_STAT_AREA] >= min_component_area))
+    return {"ink_ratio": ink_ratio, "std": std, "components": components}
+
+
+# ink and contrast decide; the component count only clears a faint page that is nothing but specks, so a
+# diagram (lines, circles) or a single digit is never dropped from the request
+def is_blank_page(stats):
+    return (stats["std"] < min_std
+            or stats["ink_ratio"] < min_ink_ratio
+            or (stats["ink_ratio"] < faint_ink_ratio and stats["components"] == 0))
+
+
+# === Page numbers (1-based) of blank pages among encoded page bytes ===
+def find_blank_pages(page_bytes):
+    blank = []
+    for page_num, data in enumerate(page_bytes, start=1):
+        gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+        if is_blank_page(blank_page_stats(gray)):
+            blank.append(page_num)
+    return blank
+
+
+# === The model only saw the kept pages, numbered 1..k - map its "pages" back to the PDF's page numbers ===
+def remap_pages(results, kept_page_numbers):
+    for item in results:
+        if isinstance(item, dict) and isinstance(item.get("pages"), list):
+            item["pages"] = [kept_page_numbers[p - 1] if isinstance(p, int) and 0 < p <= len(kept_page_numbers) else p
+                             for p in item["pages"]]
+    return results
+
+
+# === Entries recording the skipped pages in the output JSON ===
+def blank_page_records(blank_page_numbers):
+    return [{"question_number": "na", "ocr_text": "", "diagrams": [], "pages": [p], "blank_page": True}
+            for p in blank_page_numbers]
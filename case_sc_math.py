@@ -9,12 +9,15 @@ from dotenv import load_dotenv
 import streamlit.components.v1 as components
 import base64
 from io import BytesIO
+from page_cache import PageCache, load_pdf_pages, pdf_sha256, write_if_changed
+from page_pipeline import build_image_parts
+from streamlit_ocr_cache import cached_window_texts, prompt_version, cached_model
+from page_windows import page_windows, merge_window_results
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = cached_model(model_name)  # one client per server process, not per rerun
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -97,6 +100,10 @@ Pages : Page number of the question content
 question_number_v : this is for the content of the quesiton under "For visually impaired students"
 """
 
+render_workers = 4  # Number of processes used to rasterize pages
+pages_per_request = 4  # pages are OCR'd in windows of this many pages, concurrently
+window_overlap = 1  # pages shared by neighbouring windows, questions crossing a boundary are stitched back together
+
 st.set_page_config(layout="wide")
 st.title("Solution Improvement")
 
@@ -107,18 +114,10 @@ images = []
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 0
 
-@st.cache_data
-def load_images(folder_path, num_pages):
-    return [os.path.join(folder_path, f"page_{i+1}.png") for i in range(num_pages)]
-
-@st.cache_data(show_spinner=False)
-def load_base64_images(folder_path, num_pages):
-    b64_list = []
-    for i in range(num_pages):
-        path = os.path.join(folder_path, f"page_{i+1}.png")
-        with open(path, "rb") as f:
-            b64_list.append(base64.b64encode(f.read()).decode())
-    return b64_list
+# === One page cache per server process, so hit/miss counters survive reruns ===
+@st.cache_resource
+def get_page_cache():
+    return PageCache()
 
 # === Handle upload & convert to images ===
 if uploaded_file:
@@ -128,19 +127,19 @@ if uploaded_file:
     os.makedirs(folder_path, exist_ok=True)
 
     pdf_path = os.path.join(folder_path, uploaded_file.name)
-    with open(pdf_path, "wb") as f:
-        f.write(uploaded_file.read())
+    pdf_bytes = uploaded_file.getvalue()
+    write_if_changed(pdf_path, pdf_bytes)  # skipped on reruns when the content is unchanged
 
     st.info("🔄 Converting PDF to images...")
-    doc = fitz.open(pdf_path)
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap(dpi=300)
-        img_path = os.path.join(folder_path, f"page_{page_num+1}.png")
-        pix.save(img_path)
-
-    images = load_images(folder_path, len(doc))
-    images_b64 = load_base64_images(folder_path, len(doc))
+    # 300 DPI PNG pages come from the page cache; only a miss renders them (across worker processes)
+    page_cache = get_page_cache()
+    pdf_sha = pdf_sha256(pdf_bytes)
+    page_bytes = load_pdf_pages(pdf_bytes, pdf_path, page_cache, dpi=300, gray=False, fmt="PNG", workers=render_workers)
+    cache_stats = page_cache.stats()
+    st.write(f"**Pages:** {len(page_bytes)} | **Page cache:** {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+
+    images = build_image_parts(page_bytes, fmt="PNG")
+    images_b64 = [base64.b64encode(data).decode() for data in page_bytes]
 else:
     images_b64 = []
 
@@ -151,12 +150,17 @@ if uploaded_file:
     json_path = os.path.join(folder_path, "output.json") if folder_path else ""
     if images:
         try:
-            image_objects = [Image.open(p) for p in images]
-            response = model.generate_content([PROMPT] + image_objects)
-            raw = response.text.strip()
-            st.write(f"Raw Response from Gemini: {raw}")
-            cleaned = raw.strip('```json').strip('```').strip()
-            parsed = json.loads(cleaned)
+            # Memoized per (pdf hash, model, prompt version, windows): reruns from page navigation don't call Gemini again
+            page_numbers = list(range(1, len(images) + 1))
+            windows = tuple(tuple(w) for w in page_windows(page_numbers, pages_per_request, window_overlap))
+            window_results, _ = cached_window_texts(
+                pdf_sha, model_name, prompt_version(PROMPT), windows, model, PROMPT, dict(zip(page_numbers, images))
+            )
+            for window in window_results:
+                st.write(f"Raw Response from Gemini (pages {window['pages']}): {window['text'].strip()}")
+            parsed, failed_windows = merge_window_results(window_results)
+            if failed_windows:
+                st.warning(f"❌ No valid JSON for page windows: {failed_windows}")
             results.extend(parsed)
         except Exception as e:
             st.warning(f"❌ Failed to process images: {e}")
@@ -0,0 +1,25 @@
+#event loop for async gemini requests (cached_generate_async) - job_queue.run_jobs_async keeps N in flight at
+#once, run_sync runs it from scripts and from Jupyter, whose own loop is already running
+import asyncio
+import threading
+
+default_concurrency = 8  # requests in flight at once
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+# === Long-lived loop on a daemon thread: works from scripts and from Jupyter (whose loop is already running),
+# and the SDK's async client always sees the same loop ===
+def _background_loop():
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True).start()
+    return _loop
+
+
+# === Block until a coroutine finishes ===
+def run_sync(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _background_loop()).result()
@@ -52,17 +52,19 @@ import fitz  # PyMuPDF for PDF processing
 from PIL import Image
 import json
 import google.generativeai as genai
+from model_pool import get_model
 from dotenv import load_dotenv
-import base64
 import time
-import numpy as np
-import cv2
+from image_preprocessing import preprocess_pages
+from page_pipeline import build_image_parts
+from page_rasterizer import rasterize_pdf, print_page_timings
+from response_cache import cached_generate
+from response_parsing import parse_json_list
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = get_model(model_name)  # shared client, genai.configure runs once
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -72,82 +74,31 @@ Return bounding boxes as JSON arrays on all texts [ymin, xmin, ymax, xmax]
 
 # === Set the dimension value ===
 dim = 768  # Define the dimension value
+render_workers = 1  # The top of this file calls the API at import, so render in-process
+save_pages = False  # Write the resized DIM_{dim}_PAGE_N images to output_folder
 
-# === Resize Image Function ===
-def resize_image(image, dim=dim, save_path=None):
-    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
-    original_size = image1.shape  # (height, width, channels)
-    image1 = image1.mean(axis=2)  # Convert image to grayscale
-    h, w = image1.shape
-    if w > h:
-        new_w = dim
-        new_h = int(h * (dim / w))
-    else:
-        new_h = dim
-        new_w = int(w * (dim / h))
-    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    resized_image_pil = Image.fromarray(resized_image)
-    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
-    if save_path:
-        resized_image_pil.save(save_path)
-    return original_size, (new_h, new_w), resized_image_pil
-
-# === Load PDF, Convert Pages to Images ===
-def pdf_to_images(pdf_path, output_folder):
-    doc = fitz.open(pdf_path)
-    images = []
-    num_pages = doc.page_count
-    for i in range(num_pages):
-        page = doc.load_page(i)
-        pix = page.get_pixmap(dpi=300)
-        img_path_default = os.path.join(output_folder, f"page_{i + 1}.jpeg")
-        pix.save(img_path_default)
-        images.append(img_path_default)
-    return images, num_pages
-
-# === Load Base64 Images ===
-def load_base64_images(folder_path, num_pages):
-    b64_list = []
-    for i in range(num_pages):
-        img_filename_dim = f"DIM_{dim}_PAGE_{i + 1}.jpeg"  # Use dim variable here
-        img_filename_default = f"page_{i + 1}.jpeg"  # Old naming convention
-
-        img_path_dim = os.path.join(folder_path, img_filename_dim)
-        img_path_default = os.path.join(folder_path, img_filename_default)
-
-        if os.path.exists(img_path_dim):
-            path = img_path_dim
-        elif os.path.exists(img_path_default):
-            path = img_path_default
-        else:
-            print(f"❌ Image {img_filename_dim} or {img_filename_default} not found in {folder_path}")
-            continue
-
-        with open(path, "rb") as f:
-            b64_list.append(base64.b64encode(f.read()).decode())
-    return b64_list
+# === Load PDF, Convert Pages to Images (rendered directly at dim in grayscale, kept in memory as arrays) ===
+def pdf_to_images(pdf_path, output_folder, workers=render_workers, dim=dim):
+    images, timings = rasterize_pdf(pdf_path, output_folder, dpi=300, ext="jpeg", workers=workers,
+                                    dim=dim, save=False, gray=True)
+    print_page_timings(timings)
+    return images, len(images)
 
 # === Batch send to Gemini ===
 def send_to_gemini(resized_images_objs):
     try:
         # Send request to Gemini
-        response = model.generate_content([PROMPT] + resized_images_objs)  # Batch processing
+        response = cached_generate(model, [PROMPT] + resized_images_objs)  # Batch processing
         raw_response = response.text.strip()
 
         # Print raw response for debugging
         print(f"Raw response from Gemini:\n{raw_response}")
 
-        # Clean and parse JSON response
-        cleaned = raw_response.strip('```json').strip('```').strip()
-
-        # Check if there are multiple instances of invalid characters
-        if cleaned.startswith("[") and cleaned.endswith("]"):
-            # Try parsing JSON
-            parsed = json.loads(cleaned)
-            return parsed
-        else:
-            print(f"❌ Malformed JSON: {cleaned}")
-            return None
+        # Parse the JSON list (fences stripped as prefix/suffix, complete objects salvaged from a truncated response)
+        parsed = parse_json_list(raw_response)
+        if parsed is None:
+            print(f"❌ Malformed JSON: {raw_response}")
+        return parsed
     except Exception as e:
         print(f"❌ Failed to process images: {e}")
         return None
@@ -161,23 +112,14 @@ def main(pdf_file_path, output_folder):
     # Step 1: Convert PDF to images
     images, num_pages = pdf_to_images(pdf_file_path, output_folder)
 
-    # Step 2: Resize images
-    resized_images = []
-    for page_num in range(len(images)):
-        img_path = images[page_num]
-        original_size, new_size, resized_image = resize_image(Image.open(img_path), dim=dim)
-        
-        # Save resized image
-        img_filename_dim = f"DIM_{dim}_PAGE_{page_num + 1}.jpeg"
-        resized_image.save(os.path.join(output_folder, img_filename_dim))
-        
-        resized_images.append(resized_image)
-
-    # Step 3: Load base64 images
-    images_b64 = load_base64_images(output_folder, len(images))
-
-    # Step 4: Send to Gemini for OCR
-    results = send_to_gemini(resized_images)
+    # Step 2: Preprocess all pages as a batch (already rendered at dim, so no real downscale here)
+    # Disk is only an optional sink now
+    save_paths = [os.path.join(output_folder, f"DIM_{dim}_PAGE_{i + 1}.jpeg") for i in range(len(images))] if save_pages else None
+    pages = preprocess_pages(images, dim=dim, save_paths=save_paths)
+    image_parts = build_image_parts(pages)  # encoded once here, the SDK gets the bytes instead of re-encoding PIL images
+
+    # Step 3: Send to Gemini for OCR
+    results = send_to_gemini(image_parts)
 
     if results:
         output_json_filename = f"outpukt.json"
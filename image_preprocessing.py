@@ -0,0 +1,123 @@
+#shared preprocessing for page images sent to gemini - uint8 grayscale all the way, no float64 intermediate
+#every script imports resize_image / preprocess_pages from here instead of keeping its own copy
+import os
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import cv2
+from PIL import Image
+
+# === Set the dimension value ===
+dim = 768  # Define the dimension value
+default_workers = min(8, os.cpu_count() or 1)  # threads for batch preprocessing (cv2 and PIL release the GIL)
+page_byte_budget = 150 * 1024  # max encoded bytes per page, None = single encode with PIL defaults
+jpeg_quality_range = (40, 95)  # JPEG quality searched within this range, highest that fits wins
+
+
+# === Grayscale as uint8 (2D array) ===
+def to_gray(image):
+    if isinstance(image, Image.Image):
+        return np.asarray(image.convert('L'))
+    if image.ndim == 2:
+        return image  # already single-channel (e.g. rendered with csGRAY)
+    if image.shape[2] == 4:
+        return cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+    return cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
+
+
+# === Longest side -> dim, keeping the aspect ratio ===
+def target_size(h, w, dim=dim):
+    if w > h:
+        return int(h * (dim / w)), dim
+    return dim, int(w * (dim / h))
+
+
+# === Resize a grayscale page, stays single-channel ===
+def resize_gray(image, dim=dim):
+    gray = to_gray(image)
+    h, w = gray.shape
+    new_h, new_w = target_size(h, w, dim)
+    if (new_h, new_w) != (h, w):
+        gray = cv2.resize(gray, (new_w, new_h), interpolation=cv2.INTER_AREA)
+    return gray
+
+
+# === Resize Image Function ===
+# Same contract as the old per-script resize_image, but returns a single-channel ('L') PIL image
+# transform (e.g. template masking) runs on the resized uint8 array before anything is encoded
+def resize_image(image, dim=dim, save_path=None, transform=None):
+    original_size = image.size[::-1] if isinstance(image, Image.Image) else image.shape  # (height, width[, channels])
+    resized = resize_gray(image, dim)
+    if transform is not None:
+        resized = transform(resized)
+    resized_image_pil = Image.fromarray(resized)
+    if save_path:
+        resized_image_pil.save(save_path)
+    return original_size, resized.shape, resized_image_pil
+
+
+# === Encode an image to bytes in memory ===
+def encode_image(image, fmt="JPEG", **save_kwargs):
+    buffer = BytesIO()
+    image.save(buffer, format=fmt, **save_kwargs)
+    return buffer.getvalue()
+
+
+# === Encode once, under max_bytes: binary search on JPEG quality (highest that fits) or
+# PNG compress_level (lowest, i.e. fastest, that fits); falls back to the smallest setting
+# Returns (bytes, quality or compress_level)
+def encode_within_budget(image, fmt="JPEG", max_bytes=page_byte_budget):
+    fmt = fmt.upper()
+    if max_bytes is None:
+        return encode_image(image, fmt=fmt), None
+    if fmt in ("JPEG", "JPG"):
+        lo, hi = jpeg_quality_range
+        option, prefer_high = "quality", True
+    elif fmt == "PNG":
+        lo, hi = 1, 9
+        option, prefer_high = "compress_level", False
+    else:
+        return encode_image(image, fmt=fmt), None
+
+    best = None
+    while lo <= hi:
+        mid = (lo + hi) // 2
+        data = encode_image(image, fmt=fmt, **{option: mid})
+        if len(data) <= max_bytes:
+            best = (data, mid)
+            if prefer_high:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        elif prefer_high:
+            hi = mid - 1
+        else:
+            lo = mid + 1
+    if best is None:  # nothing fits, send the smallest we can make
+        setting = jpeg_quality_range[0] if prefer_high else 9
+        best = (encode_image(image, fmt=fmt, **{option: setting}), setting)
+    return best
+
+
+# === Resize + grayscale + encode one page ===
+# The encoded bytes are the only copy: model request, preview (base64) and save_path all use them
+def preprocess_page(image, dim, fmt, save_path, transform=None, max_bytes=page_byte_budget):
+    original_size, new_size, resized_image = resize_image(image, dim=dim, transform=transform)
+    encoded, setting = encode_within_budget(resized_image, fmt=fmt, max_bytes=max_bytes)
+    if save_path:
+        with open(save_path, "wb") as f:
+            f.write(encoded)
+    return {"original_size": original_size, "new_size": new_size, "image": resized_image, "bytes": encoded,
+            "quality": setting}
+
+
+# === Batch: preprocess a list of pages (PIL images or arrays) on a thread pool, keeping order ===
+def preprocess_pages(pages, dim=dim, fmt="JPEG", save_paths=None, workers=default_workers, transform=None,
+                     max_bytes=page_byte_budget):
+    save_paths = save_paths or [None] * len(pages)
+    if workers <= 1 or len(pages) <= 1:
+        return [preprocess_page(p, dim, fmt, path, transform, max_bytes) for p, path in zip(pages, save_paths)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(lambda args: preprocess_page(args[0], dim, fmt, args[1], transform, max_bytes),
+                             zip(pages, save_paths)))
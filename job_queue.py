@@ -0,0 +1,291 @@
+#durable job table for directory-scale runs: every input file is a row (pending / running / done / failed) with
+#its attempts, timings, last error and output path in a local sqlite file, so a crash, kernel restart or quota
+#exhaustion at file 180 of 300 only loses the files that were in flight - the next run skips finished work and
+#retries failures with backoff. Workers must be idempotent (same input -> same output path, overwritten).
+#usage: python job_queue.py status [queue]
+#       python job_queue.py resume <queue>   (requeue stale running rows and failures that ran out of attempts)
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+default_queue_path = os.path.join(os.path.expanduser("~"), ".cache", "subjective_grading", "jobs.sqlite")
+max_attempts = 3
+retry_base_delay = 30  # seconds before the first retry of a failed item, doubled per attempt
+retry_max_delay = 15 * 60
+stale_after = 2 * 3600  # a "running" row older than this belongs to a run that died
+job_statuses = ("pending", "running", "done", "failed")
+
+_host = socket.gethostname()
+_active_runs = {}  # (db path, queue name) -> run_jobs / run_jobs_async calls of this process working on it
+_active_lock = threading.Lock()
+
+
+def _owner_alive(owner):
+    host, _, pid = (owner or "").rpartition(":")
+    if host != _host or not pid.isdigit():
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by someone else
+        return True
+    return True
+
+
+def retry_delay(attempts):
+    return min(retry_max_delay, retry_base_delay * 2 ** max(0, attempts - 1))
+
+
+class JobQueue:
+    def __init__(self, name, path=default_queue_path, max_attempts=max_attempts):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.name = name
+        self.path = path
+        self.max_attempts = max_attempts
+        self.owner = f"{_host}:{os.getpid()}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")  # several notebooks may work on the same file
+        self._db.execute("""CREATE TABLE IF NOT EXISTS queues (name TEXT PRIMARY KEY, meta TEXT, created REAL)""")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+            queue TEXT, item TEXT, status TEXT, attempts INTEGER, last_error TEXT, output_path TEXT,
+            owner TEXT, added REAL, started REAL, finished REAL, seconds REAL, next_attempt REAL,
+            PRIMARY KEY (queue, item))""")
+        self._db.commit()
+
+    # === Register items (already known ones keep their state); meta is stored for resume ===
+    # a done item whose output file has disappeared goes back to pending
+    def add(self, items, **meta):
+        now = time.time()
+        with self._lock:
+            if meta:
+                self._db.execute("INSERT OR REPLACE INTO queues VALUES (?, ?, COALESCE("
+                                 "(SELECT created FROM queues WHERE name = ?), ?))",
+                                 (self.name, json.dumps(meta, default=str), self.name, now))
+            self._db.executemany("INSERT OR IGNORE INTO jobs (queue, item, status, attempts, added, next_attempt) "
+                                 "VALUES (?, ?, 'pending', 0, ?, 0)", [(self.name, str(i), now) for i in items])
+            rows = self._db.execute("SELECT item, output_path FROM jobs WHERE queue = ? AND status = 'done'",
+                                    (self.name,)).fetchall()
+            lost = [(self.name, item) for item, path in rows if path and not os.path.exists(path)]
+            self._db.executemany("UPDATE jobs SET status = 'pending', attempts = 0 WHERE queue = ? AND item = ?", lost)
+            self._db.commit()
+
+    def meta(self):
+        with self._lock:
+            row = self._db.execute("SELECT meta FROM queues WHERE name = ?", (self.name,)).fetchone()
+        return json.loads(row[0]) if row else {}
+
+    # === Running rows left behind by a dead run go back to pending ===
+    # this process's own rows count too when none of its runs is working on the queue (an interrupted cell)
+    def recover(self):
+        with _active_lock:
+            own_rows_stale = not _active_runs.get((self.path, self.name))
+        with self._lock:
+            rows = self._db.execute("SELECT item, owner, started FROM jobs WHERE queue = ? AND status = 'running'",
+                                    (self.name,)).fetchall()
+            stale = [(self.name, item) for item, owner, started in rows
+                     if (own_rows_stale if owner == self.owner else not _owner_alive(owner))
+                     or (started or 0) < time.time() - stale_after]
+            self._db.executemany("UPDATE jobs SET status = 'pending', owner = NULL WHERE queue = ? AND item = ?", stale)
+            self._db.commit()
+        return len(stale)
+
+    # === Next item to work on (pending, or failed and due for a retry), marked running; None when nothing is due ===
+    # the UPDATE re-checks the status, so of several processes sharing the file only one gets each item
+    def claim(self, items=None):
+        claimable = "next_attempt <= ? AND (status = 'pending' OR (status = 'failed' AND attempts < ?))"
+        only = f" AND item IN ({', '.join('?' * len(items))})" if items is not None else ""
+        while True:
+            now = time.time()
+            with self._lock:
+                row = self._db.execute(f"SELECT item FROM jobs WHERE queue = ? AND {claimable}{only} "
+                                       "ORDER BY attempts, item LIMIT 1",
+                                       (self.name, now, self.max_attempts, *(items or ()))).fetchone()
+                if row is None:
+                    return None
+                claimed = self._db.execute("UPDATE jobs SET status = 'running', owner = ?, started = ?, "
+                                           f"attempts = attempts + 1 WHERE queue = ? AND item = ? AND {claimable}",
+                                           (self.owner, now, self.name, row[0], now, self.max_attempts)).rowcount
+                self._db.commit()
+            if claimed == 1:
+                return row[0]
+
+    # === Seconds until the next failed item may be retried, None when no retry is left ===
+    def next_retry_in(self, items=None):
+        only = f" AND item IN ({', '.join('?' * len(items))})" if items is not None else ""
+        with self._lock:
+            row = self._db.execute("SELECT MIN(next_attempt) FROM jobs WHERE queue = ? AND status = 'failed' "
+                                   f"AND attempts < ?{only}", (self.name, self.max_attempts, *(items or ()))).fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def complete(self, item, output_path=None, seconds=None):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'done', output_path = ?, finished = ?, seconds = ?, "
+                             "last_error = NULL, owner = NULL WHERE queue = ? AND item = ?",
+                             (output_path, time.time(), seconds, self.name, str(item)))
+            self._db.commit()
+
+    def fail(self, item, error, seconds=None):
+        now = time.time()
+        with self._lock:
+            attempts = self._db.execute("SELECT attempts FROM jobs WHERE queue = ? AND item = ?",
+                                        (self.name, str(item))).fetchone()[0]
+            self._db.execute("UPDATE jobs SET status = 'failed', last_error = ?, finished = ?, seconds = ?, "
+                             "next_attempt = ?, owner = NULL WHERE queue = ? AND item = ?",
+                             (str(error)[:2000], now, seconds, now + retry_delay(attempts), self.name, str(item)))
+            self._db.commit()
+
+    # === Give failures that ran out of attempts (and stale running rows) another round ===
+    def resume(self):
+        recovered = self.recover()
+        with self._lock:
+            requeued = self._db.execute("UPDATE jobs SET status = 'pending', attempts = 0, next_attempt = 0 "
+                                        "WHERE queue = ? AND status = 'failed' AND attempts >= ?",
+                                        (self.name, self.max_attempts)).rowcount
+            self._db.commit()
+        return recovered + requeued
+
+    # === Items that still need work, in item order ===
+    def pending(self):
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT item FROM jobs WHERE queue = ? AND status != 'done' "
+                                                       "ORDER BY item", (self.name,))]
+
+    def counts(self):
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status",
+                                    (self.name,)).fetchall()
+        return {status: dict(rows).get(status, 0) for status in job_statuses}
+
+    def failures(self):
+        with self._lock:
+            return self._db.execute("SELECT item, attempts, last_error FROM jobs WHERE queue = ? AND status = 'failed' "
+                                    "ORDER BY item", (self.name,)).fetchall()
+
+    def print_summary(self):
+        counts = self.counts()
+        total = sum(counts.values())
+        with self._lock:
+            seconds = self._db.execute("SELECT SUM(seconds) FROM jobs WHERE queue = ? AND status = 'done'",
+                                       (self.name,)).fetchone()[0] or 0
+        print(f"📋 Queue {self.name}: {counts['done']}/{total} done, {counts['pending']} pending, "
+              f"{counts['running']} running, {counts['failed']} failed ({seconds:.0f} s of work done)")
+        for item, attempts, error in self.failures():
+            print(f"   ❌ {item} (attempt {attempts}/{self.max_attempts}): {error}")
+
+
+def _finish(queue, item, start_time, result, on_done):
+    if isinstance(result, Exception):
+        queue.fail(item, result, time.time() - start_time)
+    else:
+        queue.complete(item, result, time.time() - start_time)
+    if on_done:
+        on_done(item, result)
+
+
+def _run_started(queue):
+    queue.recover()
+    with _active_lock:
+        key = (queue.path, queue.name)
+        _active_runs[key] = _active_runs.get(key, 0) + 1
+
+
+def _run_ended(queue):
+    with _active_lock:
+        _active_runs[(queue.path, queue.name)] -= 1
+
+
+# === Work through the queue: worker(item) returns the output path, an exception marks the item failed ===
+# `concurrency` workers claim items until nothing is left; failed items are retried after their backoff
+# items limits the run to those items (e.g. the files still in the input directory), None = the whole queue
+# on_done(item, output path or exception) is called after every attempt
+def run_jobs(queue, worker, concurrency=1, on_done=None, items=None):
+    items = None if items is None else [str(item) for item in items]
+    stop = threading.Event()  # set on an interrupt, the workers finish their current item and return
+
+    def loop():
+        while not stop.is_set():
+            item = queue.claim(items)
+            if item is None:
+                wait = queue.next_retry_in(items)
+                if wait is None:
+                    return
+                stop.wait(wait)
+                continue
+            start_time = time.time()
+            try:
+                result = worker(item)
+            except Exception as e:
+                result = e
+            _finish(queue, item, start_time, result, on_done)
+
+    _run_started(queue)
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            futures = [pool.submit(loop) for _ in range(concurrency)]
+            try:
+                for future in futures:
+                    future.result()
+            except BaseException:
+                stop.set()
+                raise
+    finally:
+        _run_ended(queue)
+    return queue.counts()
+
+
+# === Same, for an async worker(item) (e.g. cached_generate_async requests), run with gemini_async.run_sync ===
+async def run_jobs_async(queue, worker, concurrency=1, on_done=None, items=None):
+    items = None if items is None else [str(item) for item in items]
+
+    async def loop():
+        while True:
+            item = queue.claim(items)
+            if item is None:
+                wait = queue.next_retry_in(items)
+                if wait is None:
+                    return
+                await asyncio.sleep(wait)
+                continue
+            start_time = time.time()
+            try:
+                result = await worker(item)
+            except Exception as e:
+                result = e
+            _finish(queue, item, start_time, result, on_done)
+
+    _run_started(queue)
+    try:
+        await asyncio.gather(*(loop() for _ in range(concurrency)))
+    finally:
+        _run_ended(queue)
+    return queue.counts()
+
+
+def _queue_names(path=default_queue_path):
+    if not os.path.exists(path):
+        return []
+    with sqlite3.connect(path) as db:
+        return [row[0] for row in db.execute("SELECT DISTINCT queue FROM jobs ORDER BY queue")]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("status", "resume") or (sys.argv[1] == "resume" and len(sys.argv) < 3):
+        print("usage: python job_queue.py status [queue]\n       python job_queue.py resume <queue>")
+        sys.exit(1)
+    names = sys.argv[2:3] or _queue_names()
+    for name in names:
+        queue = JobQueue(name)
+        if sys.argv[1] == "resume":
+            print(f"🔁 Requeued {queue.resume()} items of {name}, run the same process_* call again to work on them")
+            meta = queue.meta()
+            if meta:
+                print(f"   {json.dumps(meta)}")
+        queue.print_summary()
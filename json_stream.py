@@ -0,0 +1,107 @@
+#incremental parsing of a streamed JSON list: every top-level object is emitted as soon as its closing brace
+#arrives, so the apps can show questions while the rest of the response is still being generated
+import re
+import json
+import time
+
+from response_cache import get_response_cache, request_key, resolve_mode
+from rate_limiter import generate_with_limits
+from usage_log import usage_counts
+
+_trailing_comma = re.compile(r",\s*([}\]])")  # the usual LLM slip: a trailing comma before } or ]
+
+
+class JSONArrayStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0  # next char to scan
+        self.depth = 0  # 0 = outside the list, 1 = inside the list, 2+ = inside an object
+        self.in_string = False
+        self.escaped = False
+        self.start = None  # buffer index where the current top-level object began
+        self.errors = []  # raw objects that did not parse
+
+    # === Feed the next text chunk, returns the objects completed by it ===
+    def feed(self, chunk):
+        self.buffer += chunk
+        completed = []
+        while self.pos < len(self.buffer):
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+            elif self.depth == 0:
+                if char == "[":  # anything before the list (```json fences, prose) is skipped
+                    self.depth = 1
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if self.depth == 1 and char == "{":
+                    self.start = self.pos
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.start is not None:
+                    raw = self.buffer[self.start:self.pos + 1]
+                    try:
+                        completed.append(json.loads(raw))
+                    except json.JSONDecodeError:
+                        try:
+                            completed.append(json.loads(_trailing_comma.sub(r"\1", raw)))
+                        except json.JSONDecodeError:
+                            self.errors.append(raw)
+                    self.start = None
+                elif self.depth == 0:  # end of the list
+                    self.pos += 1
+                    break
+            self.pos += 1
+        return completed
+
+    @property
+    def text(self):
+        return self.buffer
+
+
+def _chunk_text(chunk):
+    try:
+        return chunk.text
+    except ValueError:  # chunk without text parts (e.g. only the finish reason)
+        return ""
+
+
+# === Stream one request, yielding each question object as it completes ===
+# timings (filled in place) gets first_question_seconds and total_seconds; a response cache hit is replayed
+# through the same parser, and a streamed response is stored in the cache once complete
+def stream_questions(model, contents, timings=None, mode=None, **kwargs):
+    timings = {} if timings is None else timings
+    start_time = time.time()
+    parser = JSONArrayStreamParser()
+    mode = resolve_mode(mode)
+    cache = get_response_cache() if mode != "bypass" else None
+    key = request_key(model, contents, **kwargs) if cache else None
+
+    cached_text = cache.get(key) if mode == "use" else None
+    response = None
+    try:
+        if cached_text is not None:
+            chunks = [cached_text]
+        else:
+            response = generate_with_limits(model, contents, stream=True, **kwargs)
+            chunks = (_chunk_text(chunk) for chunk in response)
+
+        for chunk in chunks:
+            for item in parser.feed(chunk):
+                timings.setdefault("first_question_seconds", time.time() - start_time)
+                yield item
+    finally:
+        # also when the stream breaks off: the text so far still holds the questions already yielded
+        timings["total_seconds"] = time.time() - start_time
+        timings["text"] = parser.text
+        if response is not None:  # tokens of this very request (usage_metadata arrives with the last chunk)
+            timings["usage"] = usage_counts(response)
+    if cache and cached_text is None:
+        cache.put(key, getattr(model, "model_name", "default"), parser.text)
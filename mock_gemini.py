@@ -0,0 +1,276 @@
+#offline stand-in for google.generativeai (GenerativeModel, upload_file / get_file / delete_file / list_files) for
+#load tests and benchmarks without live quota: responses are replayed from the response cache (same request key)
+#or synthesized as schema-valid question JSON, with configurable latency distributions, a requests/min quota,
+#random 429s and truncated outputs. Per-request randomness is seeded from the request, so runs are reproducible.
+#usage: import mock_gemini; mock_gemini.install(error_rate=0.05)    (notebook, before the setup cell)
+#       python mock_gemini.py v10_i.py                              (script)
+#       python mock_gemini.py streamlit run v6_i.py                 (streamlit app)
+import os
+import sys
+import json
+import time
+import types
+import random
+import asyncio
+import hashlib
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+import fitz  # PyMuPDF, page counts of PDF parts
+
+from rate_limiter import estimate_tokens
+from response_cache import ResponseCache, default_cache_path, request_key
+
+mock_usage_path = os.path.join(os.path.expanduser("~"), ".cache", "subjective_grading", "usage_mock.jsonl")
+mock_upload_index_path = os.path.join(os.path.expanduser("~"), ".cache", "subjective_grading", "uploads_mock.sqlite")
+seconds_per_output_token = 0.004  # on top of the base latency, long answers take longer
+
+
+# === Latency distributions: callables rng -> seconds ===
+def fixed(seconds):
+    return lambda rng: seconds
+
+
+def lognormal(median, sigma=0.5):
+    return lambda rng: rng.lognormvariate(0, sigma) * median
+
+
+# === Resample the latencies recorded in a usage log (usage_log.py) for one model ===
+def from_usage_log(path, model_name):
+    with open(path) as f:
+        samples = [entry["seconds"] for entry in map(json.loads, filter(str.strip, f))
+                   if entry.get("model") == model_name and entry.get("error") is None]
+    if not samples:
+        raise ValueError(f"No {model_name} calls in {path}")
+    return lambda rng: rng.choice(samples)
+
+
+default_latency = {  # base latency per model, anything else gets flash's
+    "gemini-2.5-pro": lognormal(20.0, 0.4),
+    "gemini-2.5-flash": lognormal(5.0, 0.4),
+}
+
+
+class MockResourceExhausted(Exception):
+    code = 429  # rate_limiter.is_retryable checks the status code
+
+
+class MockUsage:
+    def __init__(self, prompt_tokens, candidates_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = candidates_tokens
+        self.total_token_count = prompt_tokens + candidates_tokens
+
+
+class MockResponse:
+    def __init__(self, text, usage, finish_reason="STOP"):
+        self.text = text
+        self.usage_metadata = usage
+        self.finish_reason = finish_reason
+
+
+class MockStream:
+    def __init__(self, text, usage, chunk_delay, chunk_chars=200):
+        self.text = text
+        self.usage_metadata = None  # like the SDK: set once the last chunk has arrived
+        self._usage = usage
+        self._chunk_delay = chunk_delay
+        self._chunk_chars = chunk_chars
+
+    def __iter__(self):
+        for start in range(0, len(self.text), self._chunk_chars):
+            time.sleep(self._chunk_delay)
+            yield types.SimpleNamespace(text=self.text[start:start + self._chunk_chars])
+        self.usage_metadata = self._usage
+
+
+class MockGemini:
+    def __init__(self, latency=None, latency_scale=1.0, error_rate=0.0, truncate_rate=0.0, requests_per_minute=None,
+                 replay_path=default_cache_path, seed=0):
+        self.latency = dict(default_latency, **(latency or {}))
+        self.latency_scale = latency_scale  # e.g. 0.01 to run a benchmark 100x faster with the same shape
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.requests_per_minute = requests_per_minute
+        self.seed = seed
+        self.replay = ResponseCache(replay_path) if replay_path and os.path.exists(replay_path) else None
+        self.stats = {"requests": 0, "replayed": 0, "synthesized": 0, "throttled": 0, "truncated": 0}
+        self._attempts = {}  # request key -> calls so far, so a retry draws different dice
+        self._recent = deque()  # request times inside the last minute
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def _rng(self, key):
+        with self._lock:
+            attempt = self._attempts.get(key, 0)
+            self._attempts[key] = attempt + 1
+        return random.Random(f"{self.seed}:{key}:{attempt}")
+
+    def _over_quota(self):
+        if not self.requests_per_minute:
+            return False
+        now = time.monotonic()
+        with self._lock:
+            while self._recent and self._recent[0] < now - 60 * self.latency_scale:
+                self._recent.popleft()
+            if len(self._recent) >= self.requests_per_minute:
+                return True
+            self._recent.append(now)
+        return False
+
+    # === Schema-valid question list (response_parsing.question_schema), one question per page ===
+    def _synthesize(self, contents, rng):
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        pages = 0
+        for part in parts:
+            if isinstance(part, dict) and part.get("mime_type") == "application/pdf":
+                with fitz.open(stream=bytes(part["data"]), filetype="pdf") as doc:
+                    pages += doc.page_count
+            elif not isinstance(part, str):
+                pages += 1
+        questions = []
+        for page in range(1, max(1, pages) + 1):
+            words = " ".join(rng.choice(("the", "force", "F", "=", "m", "a", "velocity", "energy", "(", ")", "2",
+                                         "9.8", "kg", "therefore", "x", "+", "1/2", "mv^2")) for _ in range(rng.randint(40, 160)))
+            questions.append({"question_number": str(page), "ocr_text": words, "diagrams": [], "pages": [page],
+                              "mark": "na"})
+        return json.dumps(questions, indent=1)
+
+    def _respond(self, model, contents, kwargs):
+        key = request_key(model, contents, **{k: v for k, v in kwargs.items() if k != "stream"})
+        rng = self._rng(key)
+        with self._lock:
+            self.stats["requests"] += 1
+        if self._over_quota() or rng.random() < self.error_rate:
+            with self._lock:
+                self.stats["throttled"] += 1
+            time.sleep(0.05 * self.latency_scale)
+            raise MockResourceExhausted("429 Resource has been exhausted (mock)")
+        text = self.replay.get(key) if self.replay else None
+        with self._lock:
+            self.stats["replayed" if text is not None else "synthesized"] += 1
+        if text is None:
+            text = self._synthesize(contents, rng)
+        finish_reason = "STOP"
+        if rng.random() < self.truncate_rate:
+            text = text[:rng.randint(1, max(1, len(text) - 1))]
+            finish_reason = "MAX_TOKENS"
+            with self._lock:
+                self.stats["truncated"] += 1
+        output_tokens = len(text) // 4 + 1
+        name = model.model_name.split("/")[-1]
+        base = self.latency.get(name, self.latency["gemini-2.5-flash"])(rng)
+        seconds = (base + output_tokens * seconds_per_output_token) * self.latency_scale
+        return text, MockUsage(estimate_tokens(contents), output_tokens), finish_reason, seconds
+
+    # === Files ===
+    def upload_file(self, path, mime_type=None, **kwargs):
+        with open(path, "rb") as f:
+            data = f.read()
+        sha = hashlib.sha256(data).hexdigest()
+        file = types.SimpleNamespace(
+            name=f"files/mock-{sha[:16]}", uri=f"mock://{sha[:16]}", mime_type=mime_type or "application/pdf",
+            size_bytes=len(data), sha256_hash=sha, data=data, state=types.SimpleNamespace(name="ACTIVE"),
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48))
+        with self._lock:
+            self._files[file.name] = file
+        time.sleep(len(data) / 20e6 * self.latency_scale)  # ~20 MB/s upload
+        return file
+
+    def get_file(self, name):
+        with self._lock:
+            if name not in self._files:
+                raise KeyError(f"404 File {name} not found (mock)")
+            return self._files[name]
+
+    def delete_file(self, name):
+        with self._lock:
+            self._files.pop(getattr(name, "name", name), None)
+
+    def list_files(self):
+        with self._lock:
+            return list(self._files.values())
+
+
+# === Drop-in for genai.GenerativeModel ===
+class MockGenerativeModel:
+    def __init__(self, model_name="gemini-2.5-pro", mock=None, generation_config=None, system_instruction=None,
+                 **kwargs):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self._generation_config = dict(generation_config or {})  # same attributes as the SDK, so replay keys match
+        self._system_instruction = system_instruction
+        self._mock = mock or get_mock()
+
+    def _contents(self, contents):
+        # an uploaded mock File stands in for its bytes, so replay keys match the inline-PDF keys
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        return [{"mime_type": part.mime_type, "data": part.data} if hasattr(part, "sha256_hash") else part
+                for part in parts]
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        text, usage, finish_reason, seconds = self._mock._respond(self, self._contents(contents), kwargs)
+        if stream:
+            chunks = max(1, len(text) // 200)
+            time.sleep(seconds / 2)  # time to first token
+            return MockStream(text, usage, seconds / 2 / chunks)
+        time.sleep(seconds)
+        return MockResponse(text, usage, finish_reason)
+
+    async def generate_content_async(self, contents, **kwargs):
+        text, usage, finish_reason, seconds = self._mock._respond(self, self._contents(contents), kwargs)
+        await asyncio.sleep(seconds)
+        return MockResponse(text, usage, finish_reason)
+
+
+_mock = None
+
+
+def get_mock():
+    global _mock
+    if _mock is None:
+        _mock = MockGemini()
+    return _mock
+
+
+# === Route google.generativeai to the mock for this process ===
+# the response cache is bypassed (mock answers must not be stored as real ones) and usage / upload records go to
+# their own files, so "python usage_log.py summary <mock_usage_path>" is the benchmark report
+def install(**options):
+    global _mock
+    _mock = MockGemini(**options)
+    os.environ["RESPONSE_CACHE"] = "bypass"
+    try:
+        import google.generativeai as genai
+    except ImportError:  # offline box without the SDK: provide the module itself
+        google = sys.modules.setdefault("google", types.ModuleType("google"))
+        genai = types.ModuleType("google.generativeai")
+        google.generativeai = genai
+        sys.modules["google.generativeai"] = genai
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = MockGenerativeModel
+    for name in ("upload_file", "get_file", "delete_file", "list_files"):
+        setattr(genai, name, getattr(_mock, name))
+
+    import usage_log
+    import upload_manager
+    usage_log._log = usage_log.UsageLog(mock_usage_path)
+    upload_manager._manager = upload_manager.UploadManager(mock_upload_index_path)
+    print(f"🧪 Gemini is mocked (usage log: {mock_usage_path})")
+    return _mock
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python mock_gemini.py <script.py> [args]  |  python mock_gemini.py streamlit run <app.py>")
+        sys.exit(1)
+    options = json.loads(os.getenv("MOCK_GEMINI", "{}"))  # e.g. '{"error_rate": 0.05, "latency_scale": 0.1}'
+    install(**options)
+    sys.argv = sys.argv[1:]
+    if sys.argv[0] == "streamlit":
+        from streamlit.web import cli
+        sys.exit(cli.main())
+    import runpy
+    sys.path.insert(0, os.path.dirname(os.path.abspath(sys.argv[0])))
+    runpy.run_path(sys.argv[0], run_name="__main__")
+    print(f"🧪 Mock stats: {_mock.stats}")
@@ -0,0 +1,214 @@
+#cost-aware model cascade - every page is OCR'd by the fast model first and checked locally: schema validity,
+#CER against a second fast sample, and the numbers / brackets of the two samples agreeing. only pages that fail
+#are re-sent to the strong model. the end-of-run report compares throughput, latency and cost with pro-only
+import re
+import json
+import time
+import difflib
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from blank_pages import remap_pages
+from rate_limiter import estimate_tokens
+from response_cache import cached_generate
+from response_parsing import parse_json_list, question_schema, structured_output_config
+
+fast_model_name = "gemini-2.5-flash"
+strong_model_name = "gemini-2.5-pro"
+max_sample_cer = 0.08  # two fast samples further apart than this = the model is unsure about the page
+min_number_agreement = 0.9  # share of numbers both fast samples read identically
+# USD per 1M tokens (input, output), list prices for prompts under 200k tokens
+model_prices = {
+    "gemini-2.5-pro": (1.25, 10.0),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+_number = re.compile(r"\d+(?:\.\d+)?")
+_json_types = {"string": str, "integer": int, "array": list, "object": dict}
+
+
+def _model_name(model):
+    return getattr(model, "model_name", "default").split("/")[-1]
+
+
+def request_cost(model_name, input_tokens, output_tokens):
+    price_in, price_out = model_prices.get(model_name, model_prices[strong_model_name])
+    return (input_tokens * price_in + output_tokens * price_out) / 1e6
+
+
+# === Output entry for a page whose calls failed, like blank_pages.blank_page_records for skipped pages ===
+def failed_page_record(page_number, error):
+    return {"question_number": "na", "ocr_text": "", "diagrams": [], "pages": [page_number], "error": error}
+
+
+def _ocr_text(items):
+    return " ".join(str(item.get("ocr_text", "")) for item in items if isinstance(item, dict))
+
+
+# === Character error rate between two transcriptions (whitespace and case ignored) ===
+def character_error_rate(reference, hypothesis):
+    reference, hypothesis = (re.sub(r"\s+", "", text.lower()) for text in (reference, hypothesis))
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+    return 1 - difflib.SequenceMatcher(None, reference, hypothesis, autojunk=False).ratio()
+
+
+# === Why the items don't match question_schema (empty list = valid) ===
+def schema_errors(items):
+    if items is None:
+        return ["not a JSON list"]
+    spec = question_schema["items"]
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append(f"item {index} is not an object")
+            continue
+        errors += [f"item {index} has no {field}" for field in spec["required"] if field not in item]
+        for field, prop in spec["properties"].items():
+            if field in item and not isinstance(item[field], _json_types[prop["type"]]):
+                errors.append(f"item {index} {field} is not a {prop['type']}")
+    return errors
+
+
+# === Numbers / equations: brackets balanced, and the numbers of both samples agree ===
+def numeric_check(text, second_text):
+    balanced = all(text.count(open_) == text.count(close) for open_, close in ("()", "[]", "{}"))
+    first, second = Counter(_number.findall(text)), Counter(_number.findall(second_text))
+    total = sum((first | second).values())
+    agreement = sum((first & second).values()) / total if total else 1.0
+    return balanced, agreement
+
+
+class ModelCascade:
+    def __init__(self, fast_model, strong_model, prompt, workers=4, baseline=False, log_path=None):
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.prompt = prompt
+        self.workers = workers
+        self.baseline = baseline  # also send every page to the strong model, to measure pro-only instead of estimating
+        self.log_path = log_path
+
+    def _call(self, model, part, mode=None):
+        contents = [self.prompt, part]
+        start_time = time.time()
+        response = cached_generate(model, contents, mode=mode, generation_config=structured_output_config)
+        seconds = time.time() - start_time
+        usage = getattr(response, "usage_metadata", None)
+        input_tokens = getattr(usage, "prompt_token_count", None) or estimate_tokens(contents)
+        output_tokens = getattr(usage, "candidates_token_count", None) or len(response.text) // 4
+        name = _model_name(model)
+        cached = getattr(response, "from_cache", False)  # a cache hit spent no tokens
+        return response.text, {"model": name, "seconds": round(seconds, 2), "input_tokens": input_tokens,
+                               "output_tokens": output_tokens, "cached": cached,
+                               "cost": 0.0 if cached else request_cost(name, input_tokens, output_tokens)}
+
+    # === The local checks on the two fast samples ===
+    def _checks(self, raw, second_raw):
+        items = parse_json_list(raw, repair=False)  # a broken list is a failure here, not something to salvage
+        second_items = parse_json_list(second_raw, repair=False) or []
+        text, second_text = _ocr_text(items or []), _ocr_text(second_items)
+        balanced, number_agreement = numeric_check(text, second_text)
+        checks = {
+            "schema_errors": schema_errors(items)[:5],
+            "sample_cer": round(character_error_rate(text, second_text), 3),
+            "brackets_balanced": balanced,
+            "number_agreement": round(number_agreement, 3),
+        }
+        checks["passed"] = (not checks["schema_errors"] and checks["sample_cer"] <= max_sample_cer
+                            and balanced and number_agreement >= min_number_agreement)
+        return items, checks
+
+    # === One page; a page whose calls still fail after the rate limiter's retries is logged, the run goes on ===
+    def _run_page(self, page):
+        try:
+            return self._cascade_page(page)
+        except Exception as e:
+            print(f"❌ Page {page['page']} failed: {e}")
+            error = f"{e.__class__.__name__}: {e}"
+            return {"page": page["page"], "error": error, "checks": None, "calls": [], "escalated": False,
+                    "latency": 0.0, "items": [failed_page_record(page["page"], error)]}
+
+    # === One page: two fast samples at once, the strong model only if the checks fail ===
+    def _cascade_page(self, page):
+        part = {"mime_type": "image/jpeg", "data": page["bytes"]}
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            first = pool.submit(self._call, self.fast_model, part)
+            second = pool.submit(self._call, self.fast_model, part, "bypass")  # a cached copy would always agree
+            (raw, first_call), (second_raw, second_call) = first.result(), second.result()
+        items, checks = self._checks(raw, second_raw)
+        record = {"page": page["page"], "checks": checks, "calls": [first_call, second_call], "escalated": False,
+                  "latency": max(first_call["seconds"], second_call["seconds"])}
+        if not checks["passed"]:
+            strong_raw, strong_call = self._call(self.strong_model, part)
+            items = parse_json_list(strong_raw)
+            record["calls"].append(strong_call)
+            record["escalated"] = True
+            record["latency"] += strong_call["seconds"]
+        if self.baseline:
+            record["baseline"] = strong_call if record["escalated"] else self._call(self.strong_model, part)[1]
+        record["items"] = remap_pages(items or [], [page["page"]])
+        return record
+
+    # === pages: dicts with "page" and JPEG "bytes" (page_pipeline.stream_pages), returns (results, log) ===
+    def run(self, pages):
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            records = list(pool.map(self._run_page, pages))
+        wall_seconds = time.time() - start_time
+        log = []
+        for record in records:
+            entry = {key: value for key, value in record.items() if key != "items"}
+            entry["questions"] = 0 if record.get("error") else len(record["items"])
+            log.append(entry)
+            if self.log_path:
+                with open(self.log_path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+        results = [item for record in records for item in record["items"]]
+        return results, {"pages": log, "wall_seconds": wall_seconds, "workers": self.workers}
+
+
+def _p(values, q):
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    # inclusive, like usage_log: a small sample's p95 stays inside the data instead of past the slowest page
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+# === End-of-run report: cascade vs pro-only (measured with baseline=True, otherwise estimated) ===
+def print_cascade_report(run_log):
+    pages, workers = [entry for entry in run_log["pages"] if not entry.get("error")], run_log["workers"]
+    failed = [entry["page"] for entry in run_log["pages"] if entry.get("error")]
+    if failed:
+        print(f"   ❌ {len(failed)} pages failed, recorded with an error in the results: {failed}")
+    if not pages:
+        print("   ⚪ No pages sent")
+        return
+    escalated = sum(entry["escalated"] for entry in pages)
+    cascade_cost = sum(call["cost"] for entry in pages for call in entry["calls"])
+    cascade_latency = [entry["latency"] for entry in pages]
+
+    measured = all("baseline" in entry for entry in pages)
+    if measured:
+        pro_calls = [entry["baseline"] for entry in pages]
+        pro_cost = sum(call["cost"] for call in pro_calls)
+        pro_latency = [call["seconds"] for call in pro_calls]
+    else:
+        # same prompt + image tokens, about as much output, priced at pro; latency from the escalated pages
+        pro_cost = sum(request_cost(strong_model_name, entry["calls"][0]["input_tokens"],
+                                    entry["calls"][0]["output_tokens"]) for entry in pages)
+        pro_latency = [entry["calls"][-1]["seconds"] for entry in pages if entry["escalated"]]
+
+    def line(name, cost, latency, pages_per_minute):
+        p50, p95 = (f"{_p(latency, 50):.1f} s", f"{_p(latency, 95):.1f} s") if latency else ("n/a", "n/a")
+        rate = f"{pages_per_minute:.1f}" if pages_per_minute else "n/a"
+        print(f"   {name:<10} {rate:>9} pages/min   p50 {p50:>8}   p95 {p95:>8}   ${cost:.4f}")
+
+    print(f"   🪜 {len(pages)} pages, {escalated} escalated to {strong_model_name} ({100 * escalated / len(pages):.0f}%)")
+    line("cascade", cascade_cost, cascade_latency, 60 * len(pages) / run_log["wall_seconds"])
+    pro_rate = 60 * workers / statistics.mean(pro_latency) if pro_latency else None
+    line("pro-only" if measured else "pro-only*", pro_cost, pro_latency, pro_rate)
+    if not measured:
+        print("   * estimated from token counts and the escalated pages, run with baseline=True to measure")
+    if pro_cost:
+        print(f"   💰 Cascade cost is {100 * cascade_cost / pro_cost:.0f}% of pro-only")
@@ -0,0 +1,40 @@
+#concurrent N-model comparison on one shared page set: the pages are decoded / encoded once, every model's
+#request is in flight at the same time and results come back in completion order, so an app can show each
+#model as soon as it finishes - the wait is the slowest model instead of the sum of all of them
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from response_cache import cached_generate
+
+
+# === Send prompt + image_parts to every model at once, yields (model name, result) as each one finishes ===
+# models maps name -> GenerativeModel; result is {"text", "seconds", "from_cache", "error"} and a failing
+# model does not stop the others
+def compare_models(models, prompt, image_parts, **kwargs):
+    contents = [prompt] + list(image_parts)
+
+    def run(name):
+        start_time = time.time()
+        try:
+            response = cached_generate(models[name], contents, **kwargs)
+            return {"text": response.text, "seconds": time.time() - start_time,
+                    "from_cache": getattr(response, "from_cache", False), "error": None}
+        except Exception as e:
+            return {"text": None, "seconds": time.time() - start_time, "from_cache": False, "error": e}
+
+    with ThreadPoolExecutor(max_workers=max(1, len(models))) as pool:
+        futures = {pool.submit(run, name): name for name in models}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+# === Append one comparison (per-model seconds side by side) to a JSONL log ===
+def record_latencies(path, pdf_name, results):
+    row = {"time": datetime.now().isoformat(timespec="seconds"), "pdf": pdf_name,
+           "models": {name: {"seconds": round(result["seconds"], 2), "from_cache": result["from_cache"],
+                             "error": None if result["error"] is None else str(result["error"])}
+                      for name, result in results.items()}}
+    with open(path, "a") as f:
+        f.write(json.dumps(row) + "\n")
@@ -0,0 +1,37 @@
+#process-wide GenerativeModel registry: genai.configure runs once per process (re-configuring drops the SDK's
+#client and its open connections), and one model per model name is built and reused by every caller. generation
+#config goes on each call (cached_generate(..., generation_config=...)), never on the shared model. batch scripts
+#and notebooks use get_model directly, the streamlit apps go through streamlit_ocr_cache.cached_model
+#(st.cache_resource), so a rerun never rebuilds a client
+import os
+import threading
+
+import google.generativeai as genai
+
+_models = {}
+_lock = threading.Lock()
+_configured = False
+
+
+# === genai.configure, only the first time (api_key defaults to GOOGLE_GEMINI_API, load_dotenv first) ===
+def configure_once(api_key=None):
+    global _configured
+    with _lock:
+        if not _configured:
+            genai.configure(api_key=api_key or os.getenv("GOOGLE_GEMINI_API"))
+            _configured = True
+
+
+# === The shared model for this name ===
+def get_model(model_name):
+    configure_once()
+    key = model_name.split("/")[-1]
+    with _lock:
+        if key not in _models:
+            _models[key] = genai.GenerativeModel(model_name)
+        return _models[key]
+
+
+def pool_stats():
+    with _lock:
+        return {"configured": _configured, "models": sorted(_models)}
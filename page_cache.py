@@ -0,0 +1,154 @@
+#content-addressed disk cache for rasterized + resized pages, ready-to-send encoded bytes
+#key = (sha256 of pdf bytes, page index, dim/dpi, colorspace, format), size-bounded LRU eviction
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+
+from page_rasterizer import rasterize_pdf
+from image_preprocessing import preprocess_pages, page_byte_budget
+from template_mask import template_transform
+
+default_cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "subjective_grading", "pages")
+default_max_bytes = 2 * 1024 ** 3  # 2 GB
+
+
+# === SHA-256 of the PDF content ===
+def pdf_sha256(pdf_bytes):
+    return hashlib.sha256(pdf_bytes).hexdigest()
+
+
+# === Write data to path unless the file already holds exactly these bytes ===
+def write_if_changed(path, data):
+    if os.path.exists(path) and os.path.getsize(path) == len(data):
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    with open(path, "wb") as f:
+        f.write(data)
+    return True
+
+
+# === Cache key for one page (page_index=None is the per-PDF page count entry) ===
+def page_key(pdf_sha, page_index, resolution, colorspace, fmt):
+    page = "count" if page_index is None else page_index
+    return f"{pdf_sha}_{page}_{resolution}_{colorspace}.{fmt.lower()}"
+
+
+class PageCache:
+    def __init__(self, cache_dir=default_cache_dir, max_bytes=default_max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        # key -> [size, last access], rebuilt from the directory so it survives restarts
+        self._entries = {}
+        for name in os.listdir(cache_dir):
+            if name.endswith(".tmp"):
+                continue
+            file_stat = os.stat(os.path.join(cache_dir, name))
+            self._entries[name] = [file_stat.st_size, file_stat.st_mtime]
+        self.total_bytes = sum(size for size, _ in self._entries.values())
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:  # removed behind our back
+                self._drop(key)
+                self.misses += 1
+                return None
+            entry[1] = time.time()
+            os.utime(self._path(key))  # mtime is the LRU clock across restarts
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        with self._lock:
+            tmp_path = self._path(key) + f".{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+            if key in self._entries:
+                self.total_bytes -= self._entries[key][0]
+            self._entries[key] = [len(data), time.time()]
+            self.total_bytes += len(data)
+            self._evict()
+
+    def _drop(self, key):
+        size, _ = self._entries.pop(key)
+        self.total_bytes -= size
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    # === Remove least recently used entries until under max_bytes ===
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k][1]):
+            self._drop(key)
+            if self.total_bytes <= self.max_bytes:
+                break
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self.total_bytes}
+
+
+# === Render every page at dpi (no resize) across worker processes, encoding happens in the workers ===
+def _render_full_res(pdf_path, dpi, gray, fmt, workers):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths, _ = rasterize_pdf(pdf_path, tmp_dir, dpi=dpi, ext=fmt.lower(), workers=workers, gray=gray)
+        pages = []
+        for path in paths:
+            with open(path, "rb") as f:
+                pages.append(f.read())
+    return pages
+
+
+# === Encoded page bytes for a PDF, rasterizing only when something is missing from the cache ===
+# dim set -> pages resized to dim (grayscale), dim None -> pages rendered at dpi and sent as-is
+# template (from template_mask.load_template) masks/crops resized pages and becomes part of the key
+def load_pdf_pages(pdf_bytes, pdf_path, cache, dim=None, dpi=300, gray=True, fmt="JPEG", workers=None, template=None):
+    pdf_sha = pdf_sha256(pdf_bytes)
+    resolution = f"dim{dim}" if dim else f"dpi{dpi}"
+    if dim and template is not None:
+        resolution += f"-tpl{template['id']}"
+    if dim and page_byte_budget:
+        resolution += f"-b{page_byte_budget}"  # the budget decides the encode quality
+    colorspace = "gray" if gray or dim else "rgb"  # resized pages are always grayscale
+    count_key = page_key(pdf_sha, None, resolution, colorspace, "json")
+
+    count = cache.get(count_key)
+    if count is not None:
+        keys = [page_key(pdf_sha, i, resolution, colorspace, fmt) for i in range(json.loads(count))]
+        pages = [cache.get(key) for key in keys]
+        if all(page is not None for page in pages):
+            return pages
+
+    # Miss: rasterize the whole PDF once and fill the cache
+    if dim:
+        arrays, _ = rasterize_pdf(pdf_path, dim=dim, gray=True, save=False, workers=workers)
+        transform = template_transform(template) if template is not None else None
+        encoded = [page["bytes"] for page in preprocess_pages(arrays, dim=dim, fmt=fmt, transform=transform)]
+    else:
+        encoded = _render_full_res(pdf_path, dpi, gray, fmt, workers)
+    pages = []
+    for i, data in enumerate(encoded):
+        cache.put(page_key(pdf_sha, i, resolution, colorspace, fmt), data)
+        pages.append(data)
+    cache.put(count_key, json.dumps(len(pages)).encode())
+    return pages
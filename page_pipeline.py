@@ -0,0 +1,100 @@
+#streaming pdf -> render -> resize/encode pipeline, stages run concurrently and are joined by bounded queues
+#page N+1 renders while page N is encoded, and only queue_size pages per stage are ever held in memory
+import threading
+from queue import Queue, Empty, Full
+
+import numpy as np
+
+from page_rasterizer import iter_page_arrays
+from image_preprocessing import dim, page_byte_budget, preprocess_page
+from blank_pages import blank_page_stats, is_blank_page
+
+_DONE = object()  # end-of-stream marker
+
+
+class _StageError:
+    def __init__(self, error):
+        self.error = error
+
+
+# === Put that gives up once the consumer has gone away ===
+def _put(q, item, stop):
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except Full:
+            continue
+    return False
+
+
+# === Stage 1: render pages (arrays stay valid because the pixmap travels with them) ===
+def _render_stage(pdf_path, dim, gray, outbox, stop):
+    try:
+        for page_number, pix, array in iter_page_arrays(pdf_path, dim=dim, gray=gray):
+            if not _put(outbox, (page_number, pix, array), stop):
+                return
+    except Exception as e:
+        _put(outbox, _StageError(e), stop)
+    _put(outbox, _DONE, stop)
+
+
+# === Stage 2: resize + grayscale + encode ===
+def _encode_stage(inbox, outbox, dim, fmt, save_path_for, detect_blank, transform, max_bytes, stop):
+    while not stop.is_set():
+        try:
+            item = inbox.get(timeout=0.1)
+        except Empty:
+            continue
+        if item is _DONE or isinstance(item, _StageError):
+            _put(outbox, item, stop)
+            return
+        page_number, pix, array = item
+        try:
+            save_path = save_path_for(page_number) if save_path_for else None
+            page = preprocess_page(array, dim, fmt, save_path, transform, max_bytes)
+        except Exception as e:
+            _put(outbox, _StageError(e), stop)
+            return
+        if detect_blank:
+            page["blank_stats"] = blank_page_stats(np.asarray(page["image"]))
+            page["blank"] = is_blank_page(page["blank_stats"])
+        del pix, array, page["image"]  # only the encoded bytes travel on, the rasters are released here
+        page["page"] = page_number
+        if not _put(outbox, page, stop):
+            return
+
+
+# === Yield encoded pages in order as soon as each one is ready ===
+# detect_blank=True flags blank / near-empty pages (page["blank"]) while the pixels are still at hand,
+# transform (e.g. template_mask.template_transform) runs on each resized page before encoding,
+# max_bytes is the per-page encoded size budget (see image_preprocessing.encode_within_budget)
+def stream_pages(pdf_path, dim=dim, gray=True, fmt="JPEG", queue_size=2, save_path_for=None, detect_blank=False,
+                 transform=None, max_bytes=page_byte_budget):
+    rendered = Queue(maxsize=queue_size)
+    encoded = Queue(maxsize=queue_size)
+    stop = threading.Event()
+    stages = [
+        threading.Thread(target=_render_stage, args=(pdf_path, dim, gray, rendered, stop), daemon=True),
+        threading.Thread(target=_encode_stage, args=(rendered, encoded, dim, fmt, save_path_for, detect_blank, transform, max_bytes, stop), daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+    try:
+        while True:
+            item = encoded.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()  # unblocks the stages if the consumer stops early
+        for stage in stages:
+            stage.join()
+
+
+# === Request builder: turn encoded pages (page dicts or raw bytes) into Gemini inline image parts as they arrive ===
+def build_image_parts(pages, fmt="JPEG"):
+    mime_type = f"image/{fmt.lower()}"
+    return [{"mime_type": mime_type, "data": page["bytes"] if isinstance(page, dict) else page} for page in pages]
@@ -0,0 +1,129 @@
+#shared pdf -> page image rasterizer, pages are split across worker processes (each opens its own fitz document)
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import fitz  # PyMuPDF for PDF processing
+import numpy as np
+
+# === Default number of worker processes ===
+default_workers = os.cpu_count() or 1
+
+
+# === Split page indices across workers (interleaved so heavy pages are spread out) ===
+def split_pages(num_pages, workers):
+    workers = max(1, min(workers, num_pages))
+    return [list(range(w, num_pages, workers)) for w in range(workers)]
+
+
+# === Zoom matrix so the longest side of the page comes out at dim pixels ===
+def matrix_for_dim(page_rect, dim):
+    scale = dim / max(page_rect.width, page_rect.height)
+    return fitz.Matrix(scale, scale)
+
+
+# === Wrap pixel samples as a uint8 NumPy view, no copy ===
+# (height, width) for grayscale pixmaps, (height, width, n) otherwise
+def samples_to_array(samples, width, height, n, stride):
+    if n == 1:
+        return np.ndarray((height, width), dtype=np.uint8, buffer=samples, strides=(stride, 1))
+    return np.ndarray((height, width, n), dtype=np.uint8, buffer=samples, strides=(stride, n, 1))
+
+
+# === Zero-copy view of a pixmap (only valid while pix is alive) ===
+def pixmap_to_array(pix):
+    return samples_to_array(pix.samples_mv, pix.width, pix.height, pix.n, pix.stride)
+
+
+# === Render one page, at dim if given, otherwise at dpi ===
+# gray=True renders with csGRAY: 1 byte per pixel straight out of MuPDF
+def render_page(page, dpi=300, dim=None, gray=False):
+    colorspace = fitz.csGRAY if gray else fitz.csRGB
+    if dim is None:
+        return page.get_pixmap(dpi=dpi, colorspace=colorspace)
+    return page.get_pixmap(matrix=matrix_for_dim(page.rect, dim), colorspace=colorspace)
+
+
+# === In-process page source: yields (page_number, pixmap, array) with the array viewing the pixmap ===
+def iter_page_arrays(pdf_path, dpi=300, dim=None, gray=False):
+    with fitz.open(pdf_path) as doc:
+        for i in range(doc.page_count):
+            pix = render_page(doc.load_page(i), dpi=dpi, dim=dim, gray=gray)
+            yield i + 1, pix, pixmap_to_array(pix)
+
+
+# === Worker: open the PDF and render the given pages ===
+# With dim set, pages are rendered straight to DIM_{dim}_PAGE_N (no 300 DPI render + downscale),
+# keep_full_res additionally keeps the page_N render at dpi.
+# With save=False nothing is written, the raw samples are handed back instead.
+def _render_pages(pdf_path, page_indices, output_folder, dpi, ext, dim=None, keep_full_res=False, save=True,
+                  gray=False):
+    doc = fitz.open(pdf_path)
+    rendered = []
+    for i in page_indices:
+        start_time = time.perf_counter()
+        page = doc.load_page(i)
+        full_res_path = None
+        if save and (dim is None or keep_full_res):
+            full_pix = render_page(page, dpi=dpi, gray=gray)
+            full_res_path = os.path.join(output_folder, f"page_{i + 1}.{ext}")
+            full_pix.save(full_res_path)
+        if save and dim is None:
+            pix, img_path = full_pix, full_res_path
+        else:
+            pix = render_page(page, dpi=dpi, dim=dim, gray=gray)
+            img_path = None
+            if save:
+                img_path = os.path.join(output_folder, f"DIM_{dim}_PAGE_{i + 1}.{ext}")
+                pix.save(img_path)
+        record = {
+            "page": i + 1,
+            "path": img_path,
+            "full_res_path": full_res_path,
+            "width": pix.width,
+            "height": pix.height,
+            "seconds": time.perf_counter() - start_time,
+        }
+        if not save:
+            record.update(samples=pix.samples, n=pix.n, stride=pix.stride)
+        rendered.append(record)
+    doc.close()
+    return rendered
+
+
+# === Rasterize every page of a PDF, keeping page order ===
+# save=False skips the disk entirely: each timing record gets an "array" (uint8 view over the samples)
+def rasterize_pdf(pdf_path, output_folder=None, dpi=300, ext="jpeg", workers=None, dim=None, keep_full_res=False,
+                  save=True, gray=False):
+    if save:
+        os.makedirs(output_folder, exist_ok=True)
+    with fitz.open(pdf_path) as doc:
+        num_pages = doc.page_count
+    if num_pages == 0:
+        return [], []
+
+    render_args = (output_folder, dpi, ext, dim, keep_full_res, save, gray)
+    chunks = split_pages(num_pages, workers or default_workers)
+    if len(chunks) == 1:
+        timings = _render_pages(pdf_path, chunks[0], *render_args)
+    else:
+        with ProcessPoolExecutor(max_workers=len(chunks)) as pool:
+            futures = [pool.submit(_render_pages, pdf_path, chunk, *render_args) for chunk in chunks]
+            timings = [t for future in futures for t in future.result()]
+
+    timings.sort(key=lambda t: t["page"])
+    if not save:
+        for t in timings:
+            t["array"] = samples_to_array(t.pop("samples"), t["width"], t["height"], t["n"], t["stride"])
+        return [t["array"] for t in timings], timings
+    images = [t["path"] for t in timings]
+    return images, timings
+
+
+# === Print per-page render timings ===
+def print_page_timings(timings):
+    for t in timings:
+        print(f"   🖼️  Page {t['page']}: {t['width']}x{t['height']} rendered in {t['seconds']:.2f}s")
+    if timings:
+        total = sum(t["seconds"] for t in timings)
+        print(f"   ⏱️  Total render time (summed over workers): {total:.2f}s")
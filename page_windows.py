@@ -0,0 +1,142 @@
+#page-window chunking for long PDFs: pages are split into overlapping windows, every window is its own
+#(concurrent) gemini request, and the per-window JSON lists are merged back by question_number / pages
+#so a question that runs across a window boundary comes out as one entry again
+import time
+import difflib
+from queue import Queue
+from concurrent.futures import ThreadPoolExecutor
+
+from response_cache import cached_generate
+from json_stream import stream_questions
+from response_parsing import parse_json_list
+from blank_pages import remap_pages
+
+window_size = 4  # pages per request
+window_overlap = 1  # pages shared by neighbouring windows, so a question split at the boundary is seen whole once
+window_workers = 4  # windows in flight at once
+text_fields = ("ocr_text", "question_ocr_text")  # the prompts use either name
+min_stitch_overlap = 20  # chars the end of one window's text must share with the start of the next to be stitched
+unnumbered = ("", "na", "n/a", "none", "null")  # question_number values that don't identify a question
+
+
+# === Split page numbers into windows of `size` pages, consecutive windows sharing `overlap` pages ===
+def page_windows(page_numbers, size=window_size, overlap=window_overlap):
+    page_numbers = list(page_numbers)
+    if len(page_numbers) <= size:
+        return [page_numbers] if page_numbers else []
+    step = max(1, size - overlap)
+    windows = []
+    for start in range(0, len(page_numbers), step):
+        windows.append(page_numbers[start:start + size])
+        if start + size >= len(page_numbers):
+            break
+    return windows
+
+
+# === One request per window, concurrently; parts_by_page maps page number -> image part ===
+# kwargs (e.g. generation_config) go to every request
+def ocr_window_texts(model, prompt, windows, parts_by_page, workers=window_workers, **kwargs):
+    def run(window):
+        start_time = time.time()
+        response = cached_generate(model, [prompt] + [parts_by_page[p] for p in window], **kwargs)
+        return {"pages": list(window), "text": response.text, "seconds": time.time() - start_time}
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(run, windows))
+
+
+# === Streamed variant: windows run concurrently, each streaming its answer ===
+# yields ("question", window pages, item) as soon as any window completes a question (pages still window-local)
+# ("error", window pages, exception) if a window's request fails, and ("window", result) once a window is done,
+# result as in ocr_window_texts plus first_question_seconds, usage (token counts, None for a cache hit) and error
+def stream_window_questions(model, prompt, windows, parts_by_page, workers=window_workers, **kwargs):
+    events = Queue()
+
+    def run(window):
+        timings, error = {}, None
+        try:
+            for item in stream_questions(model, [prompt] + [parts_by_page[p] for p in window], timings, **kwargs):
+                events.put(("question", list(window), item))
+        except Exception as e:  # timings["text"] keeps what arrived, the merge salvages its complete questions
+            error = e
+            events.put(("error", list(window), e))
+        events.put(("window", {"pages": list(window), "text": timings.get("text", ""),
+                               "seconds": timings.get("total_seconds"),
+                               "first_question_seconds": timings.get("first_question_seconds"),
+                               "usage": timings.get("usage"),
+                               "error": error.__class__.__name__ if error is not None else None}))
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for window in windows:
+            pool.submit(run, window)
+        remaining = len(windows)
+        while remaining:
+            event = events.get()
+            if event[0] == "window":
+                remaining -= 1
+            yield event
+
+
+def _text_field(item):
+    return next((field for field in text_fields if field in item), text_fields[0])
+
+
+# === Question number to stitch on, None for unnumbered items (they are never merged with each other) ===
+def _question_key(item):
+    key = str(item.get("question_number") or "").strip().lower()
+    return None if key in unnumbered else key
+
+
+# === Join two texts of the same question, dropping what both windows transcribed from the shared page ===
+def stitch_text(first, second):
+    if not first or second in first:
+        return first or second
+    if first in second:
+        return second
+    tail, head = first[-2000:], second[:2000]
+    match = difflib.SequenceMatcher(None, tail, head, autojunk=False).find_longest_match(0, len(tail), 0, len(head))
+    if match.size >= min_stitch_overlap:
+        return first[:len(first) - len(tail) + match.a] + second[match.b:]
+    return f"{first}\n{second}"
+
+
+def _merge_item(kept, item):
+    field = _text_field(kept)
+    kept[field] = stitch_text(str(kept.get(field, "")), str(item.get(_text_field(item), "")))
+    kept["pages"] = sorted(set(kept.get("pages") or []) | set(item.get("pages") or []),
+                           key=lambda p: (not isinstance(p, int), str(p) if not isinstance(p, int) else p))
+    diagram_ids = {d.get("id") for d in kept.get("diagrams") or [] if isinstance(d, dict)}
+    for diagram in item.get("diagrams") or []:
+        if isinstance(diagram, dict) and diagram.get("id") not in diagram_ids:
+            kept.setdefault("diagrams", []).append(diagram)
+    for key, value in item.items():
+        if kept.get(key) in (None, "", "na", "n/a"):
+            kept[key] = value
+
+
+def _int_pages(item):
+    return [p for p in item.get("pages") or [] if isinstance(p, int)]
+
+
+# === Merge per-window results into one list (windows may come in any order) ===
+# returns (items, pages of the windows whose response was not a JSON list)
+def merge_window_results(window_results):
+    merged, failed = [], []
+    last_by_question = {}
+    for result in sorted(window_results, key=lambda r: r["pages"][:1]):
+        items = parse_json_list(result["text"])
+        if items is None:
+            failed.append(result["pages"])
+            continue
+        for item in remap_pages([i for i in items if isinstance(i, dict)], result["pages"]):
+            key = _question_key(item)
+            kept = last_by_question.get(key) if key is not None else None
+            # same question on the same or the next page = continuation across the window boundary
+            if kept is not None and _int_pages(kept) and _int_pages(item) \
+                    and min(_int_pages(item)) <= max(_int_pages(kept)) + 1:
+                _merge_item(kept, item)
+                continue
+            merged.append(item)
+            if key is not None:
+                last_by_question[key] = item
+    return merged, failed
@@ -0,0 +1,208 @@
+#process-wide gemini rate limiter: requests/min and tokens/min token buckets per model, exponential backoff
+#with jitter on 429/503, and a rate that drops when we get throttled and creeps back up while calls succeed
+#every caller (batch scripts, notebooks, streamlit apps) goes through generate_with_limits / _async,
+#which also writes each call's tokens / latency / retries to the usage log (usage_log.py)
+import time
+import random
+import asyncio
+import threading
+from io import BytesIO
+
+from PIL import Image
+
+from usage_log import get_usage_log, LoggedStream
+
+try:
+    from google.api_core import exceptions as api_exceptions
+    retryable_errors = (api_exceptions.ResourceExhausted, api_exceptions.ServiceUnavailable)
+except ImportError:  # the status code check below still works
+    retryable_errors = ()
+
+# === Quotas per model (requests/min, tokens/min), anything else gets default_limits ===
+model_limits = {
+    "gemini-2.5-pro": (150, 2_000_000),
+    "gemini-2.5-flash": (1_000, 1_000_000),
+}
+default_limits = (60, 1_000_000)
+
+max_retries = 6
+base_delay = 2.0  # seconds, doubled per retry
+max_delay = 60.0
+throttle_factor = 0.7  # rate multiplier on every 429/503
+recovery_step = 0.02  # fraction of the configured rate won back per successful call
+min_rate_fraction = 0.05  # never slow down below this fraction of the configured rate
+
+default_file_tokens = 258 * 8  # uploaded files (PDFs ~258 tokens/page) - corrected from usage_metadata afterwards
+
+
+# === Gemini image token estimate: <=384px both sides is one 258-token image, larger ones are 768px tiles ===
+def estimate_image_tokens(h, w):
+    if h <= 384 and w <= 384:
+        return 258
+    return -(-h // 768) * -(-w // 768) * 258
+
+
+# === Rough prompt token count for a generate_content request, before sending it ===
+def estimate_tokens(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    total = 0
+    for part in parts:
+        if isinstance(part, str):
+            total += len(part) // 4 + 1
+        elif isinstance(part, dict) and "data" in part:
+            try:
+                w, h = Image.open(BytesIO(part["data"])).size  # header only, no decode
+                total += estimate_image_tokens(h, w)
+            except Exception:
+                total += 258
+        elif isinstance(part, Image.Image):
+            total += estimate_image_tokens(part.height, part.width)
+        else:
+            total += default_file_tokens
+    return total
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.max_rate = per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = per_minute / 60.0 * 10  # allow ~10 s worth of burst
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # === Take amount now (may go negative) and return how long the caller has to wait for it ===
+    def reserve(self, amount, now):
+        self._refill(now)
+        self.level -= min(amount, self.capacity)  # a request bigger than the bucket just waits for a full one
+        return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    # === Seconds to wait before sending a request of this many tokens (already reserved) ===
+    def reserve(self, tokens):
+        with self._lock:
+            now = time.monotonic()
+            return max(self.requests.reserve(1, now), self.tokens.reserve(tokens, now))
+
+    def wait(self, tokens):
+        delay = self.reserve(tokens)
+        if delay:
+            time.sleep(delay)
+
+    async def wait_async(self, tokens):
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    # === 429/503: slow both buckets down and return the backoff delay for this attempt ===
+    def on_throttle(self, attempt):
+        with self._lock:
+            self.throttled += 1
+            for bucket in (self.requests, self.tokens):
+                bucket.rate = max(bucket.max_rate * min_rate_fraction, bucket.rate * throttle_factor)
+        cap = min(max_delay, base_delay * 2 ** attempt)
+        return random.uniform(cap / 2, cap)
+
+    # === Success: win back some rate, and correct the token bucket with the real prompt size ===
+    def on_success(self, estimated_tokens, actual_tokens=None):
+        with self._lock:
+            for bucket in (self.requests, self.tokens):
+                bucket.rate = min(bucket.max_rate, bucket.rate + bucket.max_rate * recovery_step)
+            if actual_tokens is not None:
+                self.tokens.refund(estimated_tokens - actual_tokens)
+
+    def stats(self):
+        return {"requests_per_minute": round(self.requests.rate * 60, 1),
+                "tokens_per_minute": round(self.tokens.rate * 60), "throttled": self.throttled}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+# === The one limiter for a model in this process ===
+def get_limiter(model_name):
+    name = model_name.split("/")[-1]  # GenerativeModel.model_name is "models/gemini-..."
+    with _limiters_lock:
+        if name not in _limiters:
+            _limiters[name] = RateLimiter(*model_limits.get(name, default_limits))
+        return _limiters[name]
+
+
+def is_retryable(error):
+    return isinstance(error, retryable_errors) or getattr(error, "code", None) in (429, 503)
+
+
+def _usage_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    tokens = getattr(usage, "prompt_token_count", None)
+    return tokens if isinstance(tokens, int) else None
+
+
+# === Log the finished call (usage_log.py); a stream is logged once it has been read to the end ===
+def _logged(model_name, contents, response, start_time, attempt, stream):
+    if stream:
+        return LoggedStream(response, model_name, contents, start_time, attempt)
+    get_usage_log().record(model_name, contents, response, time.time() - start_time, attempt)
+    return response
+
+
+# === model.generate_content behind the limiter, retrying 429/503; other errors are raised as before ===
+# latency in the usage log is measured from the first attempt, so it includes limiter waits and backoff
+def generate_with_limits(model, contents, **kwargs):
+    model_name = getattr(model, "model_name", "default")
+    limiter = get_limiter(model_name)
+    estimated = estimate_tokens(contents)
+    start_time = time.time()
+    for attempt in range(max_retries + 1):
+        limiter.wait(estimated)
+        try:
+            response = model.generate_content(contents, **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_retries:
+                get_usage_log().record(model_name, contents, None, time.time() - start_time, attempt, e)
+                raise
+            delay = limiter.on_throttle(attempt)
+            print(f"   ⏳ Rate limited ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        limiter.on_success(estimated, _usage_tokens(response))
+        return _logged(model_name, contents, response, start_time, attempt, kwargs.get("stream"))
+
+
+async def generate_with_limits_async(model, contents, **kwargs):
+    model_name = getattr(model, "model_name", "default")
+    limiter = get_limiter(model_name)
+    estimated = estimate_tokens(contents)
+    start_time = time.time()
+    for attempt in range(max_retries + 1):
+        await limiter.wait_async(estimated)
+        try:
+            if hasattr(model, "generate_content_async"):
+                response = await model.generate_content_async(contents, **kwargs)
+            else:
+                response = await asyncio.to_thread(model.generate_content, contents, **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_retries:
+                get_usage_log().record(model_name, contents, None, time.time() - start_time, attempt, e)
+                raise
+            delay = limiter.on_throttle(attempt)
+            print(f"   ⏳ Rate limited ({e.__class__.__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+            continue
+        limiter.on_success(estimated, _usage_tokens(response))
+        get_usage_log().record(model_name, contents, response, time.time() - start_time, attempt)
+        return response
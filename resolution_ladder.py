@@ -0,0 +1,154 @@
+#adaptive resolution ladder - every page goes to gemini at the lowest dim first, only pages whose result
+#looks wrong (invalid JSON, too little text for the ink on the page, disagreement with a second pass)
+#are re-sent at the next dim up. per-page decisions and estimated token savings go to a JSONL log
+import os
+import json
+import time
+import difflib
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import fitz  # PyMuPDF for PDF processing
+
+from page_rasterizer import render_page, pixmap_to_array
+from image_preprocessing import preprocess_page, page_byte_budget, dim as budget_dim
+from blank_pages import blank_page_stats, is_blank_page, remap_pages, blank_page_records
+from rate_limiter import estimate_image_tokens
+from response_cache import cached_generate
+from response_parsing import parse_json_list, structured_output_config
+
+default_ladder = (768, 1536)  # same variants as data/768 and data/1536
+min_chars_per_ink_pct = 50  # fewer OCR characters than this per 1% of ink pixels = likely missed content
+min_agreement = 0.85  # similarity between the two low-dim passes when second_pass is on
+
+
+def _ocr_text(items):
+    return " ".join(str(item.get("ocr_text", item.get("question_ocr_text", ""))) for item in items if isinstance(item, dict))
+
+
+# === Encoded byte budget for one rung ===
+# page_byte_budget is tuned for budget_dim and scaled by pixel count (dim^2) - with a fixed budget the encoder just
+# lowers the JPEG quality until the bigger page fits, and the higher rung costs more without adding detail
+def _byte_budget(dim):
+    return int(page_byte_budget * (dim / budget_dim) ** 2) if page_byte_budget else None
+
+
+def _prompt_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "prompt_token_count", None)
+
+
+class ResolutionScheduler:
+    def __init__(self, model, prompt, ladder=default_ladder, second_pass=False, log_path=None, workers=4,
+                 transform=None, generation_config=structured_output_config):
+        self.model = model
+        self.prompt = prompt
+        self.ladder = tuple(sorted(ladder))
+        self.second_pass = second_pass
+        self.log_path = log_path
+        self.workers = workers
+        self.transform = transform  # e.g. template_mask.template_transform(template)
+        self.generation_config = generation_config  # question schema, like every other caller of this prompt
+
+    # === Render + preprocess one page at dim (bytes to send, pixels to score) ===
+    def _page_at(self, pdf_path, page_index, dim):
+        with fitz.open(pdf_path) as doc:
+            pix = render_page(doc.load_page(page_index), dim=dim, gray=True)
+            page = preprocess_page(pixmap_to_array(pix), dim, "JPEG", None, transform=self.transform,
+                                   max_bytes=_byte_budget(dim))
+        page["stats"] = blank_page_stats(np.asarray(page.pop("image")))
+        return page
+
+    def _call(self, page, mode=None):
+        response = cached_generate(self.model, [self.prompt, {"mime_type": "image/jpeg", "data": page["bytes"]}], mode=mode,
+                                   generation_config=self.generation_config)
+        return response.text, _prompt_tokens(response)
+
+    # === Score one attempt with the cheap signals ===
+    def _score(self, page, raw, second_raw=None):
+        items = parse_json_list(raw, repair=False)  # validity is a confidence signal here, no salvage
+        chars = len(_ocr_text(items)) if items is not None else 0
+        ink_pct = 100 * page["stats"]["ink_ratio"]
+        chars_per_ink_pct = chars / ink_pct if ink_pct > 0 else float("inf")
+        score = {
+            "json_valid": items is not None,
+            "chars": chars,
+            "ink_pct": round(ink_pct, 3),
+            "chars_per_ink_pct": round(chars_per_ink_pct, 1),
+        }
+        passed = items is not None and chars_per_ink_pct >= min_chars_per_ink_pct
+        if second_raw is not None:
+            second_items = parse_json_list(second_raw, repair=False)
+            score["agreement"] = round(difflib.SequenceMatcher(
+                None, _ocr_text(items or []), _ocr_text(second_items or [])).ratio(), 3)
+            passed = passed and score["agreement"] >= min_agreement
+        score["passed"] = passed
+        return items, score
+
+    # === Climb the ladder for one page until a result passes (the top rung is always accepted) ===
+    def _run_page(self, pdf_path, page_index):
+        attempts, items = [], None
+        for rung, dim in enumerate(self.ladder):
+            page = self._page_at(pdf_path, page_index, dim)
+            if rung == 0 and is_blank_page(page["stats"]):
+                return {"page": page_index + 1, "blank": True, "items": [], "attempts": [], "final_dim": None}
+            start_time = time.time()
+            raw, tokens = self._call(page)
+            second_raw = None
+            if self.second_pass and rung < len(self.ladder) - 1:
+                second_raw, second_tokens = self._call(page, mode="bypass")  # a cached copy would always agree
+                tokens = (tokens or 0) + (second_tokens or 0) if tokens is not None else None
+            items, score = self._score(page, raw, second_raw)
+            h, w = page["new_size"]
+            score.update(dim=dim, seconds=round(time.time() - start_time, 2), prompt_tokens=tokens,
+                         est_image_tokens=estimate_image_tokens(h, w) * (2 if second_raw is not None else 1))
+            attempts.append(score)
+            if score["passed"]:
+                break
+        return {"page": page_index + 1, "blank": False, "items": remap_pages(items or [], [page_index + 1]),
+                "attempts": attempts, "final_dim": attempts[-1]["dim"]}
+
+    # === Log line per page: decision + image tokens saved vs sending it at the top dim only ===
+    def _log(self, pdf_path, record, top_tokens):
+        spent = sum(a["est_image_tokens"] for a in record["attempts"])
+        entry = {
+            "pdf": os.path.basename(pdf_path),
+            "page": record["page"],
+            "blank": record["blank"],
+            "final_dim": record["final_dim"],
+            "escalated": len(record["attempts"]) > 1,
+            "attempts": record["attempts"],
+            "est_image_tokens_saved": top_tokens - spent if not record["blank"] else top_tokens,
+        }
+        if self.log_path:
+            with open(self.log_path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return entry
+
+    def run(self, pdf_path):
+        with fitz.open(pdf_path) as doc:
+            num_pages = doc.page_count
+            rect = doc.load_page(0).rect if num_pages else None
+        if not num_pages:
+            return [], []
+        # top-rung token cost of a typical page, for the savings estimate
+        top = self.ladder[-1]
+        scale = top / max(rect.width, rect.height)
+        top_tokens = estimate_image_tokens(round(rect.height * scale), round(rect.width * scale))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            records = list(pool.map(lambda i: self._run_page(pdf_path, i), range(num_pages)))
+
+        log = [self._log(pdf_path, record, top_tokens) for record in records]
+        results = [item for record in records for item in record["items"]]
+        results += blank_page_records([record["page"] for record in records if record["blank"]])
+        return results, log
+
+
+# === Print the per-run summary ===
+def print_ladder_summary(log):
+    sent = [entry for entry in log if not entry["blank"]]
+    escalated = sum(entry["escalated"] for entry in sent)
+    saved = sum(entry["est_image_tokens_saved"] for entry in log)
+    print(f"   🪜 {len(sent)} pages sent, {escalated} escalated, {len(log) - len(sent)} blank")
+    print(f"   💰 Estimated image tokens saved vs top dim only: {saved}")
@@ -0,0 +1,201 @@
+#persistent gemini response cache (sqlite) in front of generate_content
+#key = (model name + the model's own generation_config / system_instruction, sha256 of every prompt text / image /
+#pdf part, generation_config and other kwargs of the call)
+#mode "use" reads + writes, "refresh" always calls the model and overwrites, "bypass" skips the cache entirely
+#default mode comes from the RESPONSE_CACHE env var so a notebook run can be forced fresh without code changes
+import os
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+
+from PIL import Image
+
+from rate_limiter import generate_with_limits, generate_with_limits_async
+
+default_cache_path = os.path.join(os.path.expanduser("~"), ".cache", "subjective_grading", "responses.sqlite")
+default_max_bytes = 512 * 1024 ** 2  # 512 MB of response text
+cache_modes = ("use", "refresh", "bypass")
+
+
+# === Response stand-in returned on a hit (no tokens were spent, so no usage_metadata) ===
+class CachedResponse:
+    def __init__(self, text):
+        self.text = text
+        self.usage_metadata = None
+        self.from_cache = True
+
+
+# === sha256 of one request part ===
+def part_hash(part):
+    digest = hashlib.sha256()
+    if isinstance(part, str):
+        digest.update(b"text:" + part.encode("utf-8"))
+    elif isinstance(part, (bytes, bytearray)):
+        digest.update(b"bytes:" + bytes(part))
+    elif isinstance(part, dict) and "data" in part:
+        digest.update(f"{part.get('mime_type')}:".encode() + bytes(part["data"]))
+    elif isinstance(part, Image.Image):
+        digest.update(f"image:{part.mode}:{part.size}:".encode() + part.tobytes())
+    elif getattr(part, "sha256_hash", None):  # uploaded genai File - hash of its content
+        digest.update(b"file:" + str(part.sha256_hash).encode())
+    else:
+        raise TypeError(f"Can't build a cache key for a {type(part).__name__} part - pass key_contents")
+    return digest.hexdigest()
+
+
+# === Model name plus what GenerativeModel(..., generation_config=, system_instruction=) baked into the model ===
+# (two models of the same name configured differently answer differently, so they must not share entries)
+def model_identity(model):
+    if isinstance(model, str):
+        return {"model": model.split("/")[-1]}
+    identity = {"model": getattr(model, "model_name", "default").split("/")[-1]}
+    for attr in ("_generation_config", "_system_instruction"):
+        value = getattr(model, attr, None)
+        if value:  # unconfigured models keep their pre-existing keys
+            identity[attr.lstrip("_")] = value
+    return identity
+
+
+# model is a GenerativeModel (or a bare model name)
+def request_key(model, contents, **kwargs):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    payload = {
+        **model_identity(model),
+        "parts": [part_hash(part) for part in parts],
+        "config": kwargs,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, path=default_cache_path, max_bytes=default_max_bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")  # several notebooks / apps may share the file
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, model TEXT, text TEXT, size INTEGER, created REAL, accessed REAL)""")
+        self._db.commit()
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def __contains__(self, key):  # no hit / miss counted, nothing touched
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, model_name, text):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, model_name, text, len(text.encode("utf-8")), now, now))
+            self._evict()
+            self._db.commit()
+
+    # === Drop least recently used responses until under max_bytes ===
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# === The one cache for this process ===
+def get_response_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+
+def resolve_mode(mode):
+    mode = mode or os.getenv("RESPONSE_CACHE", "use")
+    if mode not in cache_modes:
+        raise ValueError(f"Unknown response cache mode {mode!r}, expected one of {cache_modes}")
+    return mode
+
+
+def _store(cache, key, model_name, response):
+    try:
+        text = response.text
+    except ValueError:  # blocked / empty candidates - nothing worth caching
+        return
+    cache.put(key, model_name, text)
+
+
+# === Would cached_generate answer this from the cache (no model call, no upload)? ===
+def is_cached(model, contents, mode=None, cache=None, **kwargs):
+    if resolve_mode(mode) != "use":
+        return False
+    return request_key(model, contents, **kwargs) in (cache or get_response_cache())
+
+
+# === generate_with_limits behind the cache ===
+# contents may be a zero-argument function (e.g. one that uploads the PDF) so work is only done on a miss;
+# key_contents then stands in for it in the key, e.g. [prompt, {"mime_type": "application/pdf", "data": pdf_bytes}]
+def cached_generate(model, contents, key_contents=None, mode=None, cache=None, **kwargs):
+    mode = resolve_mode(mode)
+    model_name = getattr(model, "model_name", "default")
+    if mode == "bypass":
+        return generate_with_limits(model, contents() if callable(contents) else contents, **kwargs)
+    cache = cache or get_response_cache()
+    key = request_key(model, key_contents if key_contents is not None else contents, **kwargs)
+    if mode == "use":
+        text = cache.get(key)
+        if text is not None:
+            return CachedResponse(text)
+    response = generate_with_limits(model, contents() if callable(contents) else contents, **kwargs)
+    _store(cache, key, model_name, response)
+    return response
+
+
+async def cached_generate_async(model, contents, key_contents=None, mode=None, cache=None, **kwargs):
+    mode = resolve_mode(mode)
+    model_name = getattr(model, "model_name", "default")
+    if mode != "bypass":
+        cache = cache or get_response_cache()
+        key = request_key(model, key_contents if key_contents is not None else contents, **kwargs)
+        if mode == "use":
+            text = cache.get(key)
+            if text is not None:
+                return CachedResponse(text)
+    if callable(contents):
+        contents = await asyncio.to_thread(contents)
+    response = await generate_with_limits_async(model, contents, **kwargs)
+    if mode != "bypass":
+        _store(cache, key, model_name, response)
+    return response
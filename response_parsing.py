@@ -0,0 +1,78 @@
+#shared parsing of the model's question list
+#structured_output_config asks gemini for JSON matching question_schema, so most responses parse directly;
+#parse_json_list still strips ``` fences (as a prefix/suffix - str.strip('```json') eats a trailing n/o/s)
+#and, when the output is truncated or slightly broken, salvages every complete question object instead of
+#throwing the whole response away
+import json
+
+from json_stream import JSONArrayStreamParser
+
+# === The question schema every OCR prompt asks for ===
+question_schema = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": {
+            "question_number": {"type": "string"},
+            "ocr_text": {"type": "string"},
+            "diagrams": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "id": {"type": "string"},
+                        "coordinates": {"type": "string"},
+                        "diagram_class": {"type": "string"},
+                    },
+                },
+            },
+            "pages": {"type": "array", "items": {"type": "integer"}},
+            "mark": {"type": "string"},
+        },
+        "required": ["question_number", "ocr_text", "pages"],
+    },
+}
+
+# generation_config for prompts that use question_schema (not for prompts with their own field names)
+structured_output_config = {"response_mime_type": "application/json", "response_schema": question_schema}
+
+
+# === Remove a leading ```json / ``` line and a trailing ``` ===
+def strip_code_fence(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+    if text.endswith("```"):
+        text = text[:-3]
+    return text.strip()
+
+
+# === Every complete top-level object of a (possibly truncated) JSON list ===
+# prose before the list is skipped by the parser; "[" is only added when the objects have no list opener
+def salvage_objects(text):
+    list_start, object_start = text.find("["), text.find("{")
+    if list_start < 0 or 0 <= object_start < list_start:
+        text = "[" + text[max(object_start, 0):]
+    return JSONArrayStreamParser().feed(text)
+
+
+# === Parse a response that should be a JSON list of questions ===
+# returns the list, or None when nothing usable is in it; repair=False only accepts a well-formed list
+def parse_json_list(raw, repair=True):
+    text = strip_code_fence(raw)
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = None
+    if isinstance(parsed, list):
+        return parsed
+    if isinstance(parsed, dict):  # {"questions": [...]} or a single question
+        nested = next((value for value in parsed.values() if isinstance(value, list)
+                       and all(isinstance(v, dict) for v in value)), None)
+        if nested is not None and "question_number" not in parsed:
+            return nested
+        return [parsed] if repair else None
+    if not repair:
+        return None
+    items = salvage_objects(text)
+    return items or None
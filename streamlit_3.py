@@ -1,39 +1,23 @@
 import os
 import json
 from PIL import Image, ImageDraw
-import numpy as np
+from image_preprocessing import resize_image
+from response_cache import cached_generate
+from response_parsing import parse_json_list
 import google.generativeai as genai
+from streamlit_ocr_cache import cached_model
 from dotenv import load_dotenv
 import base64
-import cv2
 import streamlit as st
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = cached_model(model_name)  # one client per server process, not per rerun
 
 # === Set the dimension value ===
 dim = 768  # Define the dimension value
 
-# === Resize Image Function ===
-def resize_image(image, dim=dim):
-    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
-    original_size = image1.shape  # (height, width, channels)
-    image1 = image1.mean(axis=2)  # Convert image to grayscale
-    h, w = image1.shape
-    if w > h:
-        new_w = dim
-        new_h = int(h * (dim / w))
-    else:
-        new_h = dim
-        new_w = int(w * (dim / h))
-    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    resized_image_pil = Image.fromarray(resized_image)
-    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
-    return original_size, (new_h, new_w), resized_image_pil
-
 # === Load Image ===
 def load_image(image_path):
     img = Image.open(image_path)
@@ -79,32 +63,17 @@ def draw_bounding_boxes(image, coords):
 def send_to_gemini(image, prompt):
     try:
         # Send request to Gemini with user prompt and image
-        response = model.generate_content([prompt] + [image])  # Batch processing
+        response = cached_generate(model, [prompt] + [image])  # Batch processing
         raw_response = response.text.strip()
 
         # Print raw response for debugging
         print(f"Raw response from Gemini:\n{raw_response}")
 
-        # Clean the raw response by removing any non-JSON content (e.g., text like 'Hence')
-        cleaned = raw_response.strip().lstrip("Hence").strip()  # Strip "Hence" and any leading whitespace
-        cleaned = cleaned.strip('```json').strip('```').strip()  # Clean up surrounding backticks if present
-
-        # Check if cleaned response is valid JSON
-        if cleaned.startswith("[") and cleaned.endswith("]"):
-            try:
-                # Attempt to parse the cleaned response as JSON
-                parsed = json.loads(cleaned)
-
-                # Check the structure of the parsed result (just print it)
-                print(f"Parsed result: {parsed}")
-
-                return parsed
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON decoding error: {e}")
-                return None
-        else:
-            print(f"❌ Malformed JSON: {cleaned}")
-            return None
+        # Parse the JSON list (fences stripped as prefix/suffix, complete objects salvaged from a truncated response)
+        parsed = parse_json_list(raw_response)
+        if parsed is None:
+            print(f"❌ Malformed JSON: {raw_response}")
+        return parsed
 
     except Exception as e:
         print(f"❌ Failed to process images: {e}")
@@ -124,7 +93,7 @@ def main():
         image = Image.open(uploaded_file)
 
         # Resize image
-        original_size, new_size, resized_image = resize_image(image)
+        original_size, new_size, resized_image = resize_image(image, dim=dim)
 
         # Display the resized image
         st.image(resized_image, caption="Uploaded Image", use_column_width=True)
@@ -0,0 +1,98 @@
+#memoized gemini OCR for the streamlit apps, keyed by (pdf hash, model, prompt version)
+#every widget click reruns the whole script - with this, page navigation never calls the model again
+#on top of that, cached_generate keeps responses on disk, so an app restart does not pay for them again
+#cached_model keeps the gemini clients themselves across reruns
+import time
+import hashlib
+import threading
+
+import streamlit as st
+
+from response_parsing import structured_output_config
+from page_windows import ocr_window_texts
+from model_comparison import compare_models
+from model_pool import get_model
+
+
+# === One warm client per model for the whole server process, reruns reuse it ===
+@st.cache_resource(show_spinner=False)
+def cached_model(model_name):
+    return get_model(model_name)
+
+
+# === Short, stable id for a prompt text ===
+def prompt_version(prompt):
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12]
+
+
+# === Windowed OCR (page_windows): every window's raw text + seconds, and the wall time of the whole run ===
+# underscore args are not part of the cache key
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_window_texts(pdf_sha, model_name, prompt_version, windows, _model, _prompt, _parts_by_page):
+    start_time = time.time()
+    results = ocr_window_texts(_model, _prompt, windows, _parts_by_page)
+    return results, time.time() - start_time
+
+
+# answers: finished comparisons; running: one Event per comparison some session has in flight; lock guards both
+@st.cache_resource
+def _comparison_memo():
+    return {"answers": {}, "running": {}, "lock": threading.Lock()}
+
+
+# === compare_models, memoized per (pdf hash, model, prompt version) for the whole server process ===
+# models that already answered are yielded first (result["memoized"] = True), the rest run concurrently;
+# a model another session is already running is waited for instead of being sent a second time
+def cached_comparison(pdf_sha, prompt_version, models, prompt, image_parts, structured=False):
+    memo = _comparison_memo()
+    lock = memo["lock"]
+    key = lambda name: (pdf_sha, name, prompt_version, structured)
+    with lock:
+        answered = {name: memo["answers"][key(name)] for name in models if key(name) in memo["answers"]}
+        waiting = {name: memo["running"][key(name)] for name in models
+                   if name not in answered and key(name) in memo["running"]}
+        missing = {name: model for name, model in models.items() if name not in answered and name not in waiting}
+        owned = {name: threading.Event() for name in missing}  # the events this session has to set
+        for name, event in owned.items():
+            memo["running"][key(name)] = event
+    for name, result in answered.items():
+        yield name, dict(result, memoized=True)
+
+    kwargs = {"generation_config": structured_output_config} if structured else {}
+
+    def run(to_run):
+        try:
+            for name, result in compare_models(to_run, prompt, image_parts, **kwargs):
+                with lock:
+                    if result["error"] is None:
+                        while len(memo["answers"]) >= 128:  # drop the oldest answers
+                            memo["answers"].pop(next(iter(memo["answers"])))
+                        memo["answers"][key(name)] = result
+                    release(name)
+                yield name, dict(result, memoized=False)
+        finally:  # stopped early (rerun) or failed: don't leave other sessions waiting
+            with lock:
+                for name in to_run:
+                    release(name)
+
+    def release(name):  # called under the lock
+        event = owned.pop(name, None)
+        if event is not None:
+            if memo["running"].get(key(name)) is event:
+                del memo["running"][key(name)]
+            event.set()
+
+    yield from run(missing)
+    retry = {}
+    for name, event in waiting.items():
+        while event is not None:
+            event.wait()
+            with lock:
+                result = memo["answers"].get(key(name))
+                event = memo["running"].get(key(name)) if result is None else None  # someone else retries it
+                if result is None and event is None:  # the other session's attempt failed, run it here
+                    memo["running"][key(name)] = owned[name] = threading.Event()
+                    retry[name] = models[name]
+        if result is not None:
+            yield name, dict(result, memoized=True)
+    yield from run(retry)
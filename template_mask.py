@@ -0,0 +1,124 @@
+#per-template header/footer mask, learned once per answer-sheet layout by averaging many pages of that layout
+#pixels that are ink on (almost) every page are printed template - they are blanked, and template-only
+#bands at the top/bottom are cropped, before encoding so they are never uploaded or tokenized
+#usage: python template_mask.py learn <template.npz> <pdf> [<pdf> ...]
+import sys
+import hashlib
+
+import numpy as np
+import cv2
+
+from page_rasterizer import iter_page_arrays
+from image_preprocessing import dim, resize_gray
+
+ink_threshold = 160  # pixels darker than this count as ink
+consistency = 0.8  # ink on at least this fraction of the pages = template
+dilate_px = 1  # grow the mask a little so anti-aliased template edges go too
+min_pages = 5  # averaging fewer pages than this can't separate template from writing
+band_ratio = 0.15  # header / footer bands that may be cropped
+max_line_aspect = 8  # template blobs taller than this times their width are margin / ruled lines, not header boxes
+
+
+# === Rows covered by header/footer boxes: template blobs lying entirely inside rows start..stop ===
+# vertical runs longer than the band (margin lines, full-height rules) are dropped first, they would
+# otherwise mark every row of the band as template and the crop would eat the writing next to them
+def _box_rows(mask, start, stop):
+    mask = mask.astype(np.uint8)
+    mask[cv2.morphologyEx(mask, cv2.MORPH_OPEN, np.ones((stop - start + 1, 1), np.uint8)) > 0] = 0
+    rows = np.zeros(mask.shape[0], dtype=bool)
+    _, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    for x, y, w, h, area in stats[1:]:
+        if y >= start and y + h <= stop and h <= max_line_aspect * w:
+            rows[y:y + h] = True
+    return np.flatnonzero(rows)
+
+
+# === Learn the template from grayscale pages of one layout (all resized to dim) ===
+def learn_template(gray_pages):
+    if len(gray_pages) < min_pages:
+        raise ValueError(f"Need at least {min_pages} pages to learn a template, got {len(gray_pages)}")
+    h, w = gray_pages[0].shape
+    ink_sum = np.zeros((h, w), dtype=np.uint16)
+    for gray in gray_pages:
+        if gray.shape != (h, w):
+            gray = cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA)
+        ink_sum += gray < ink_threshold
+    mask = ink_sum >= consistency * len(gray_pages)
+    if dilate_px:
+        kernel = np.ones((2 * dilate_px + 1, 2 * dilate_px + 1), np.uint8)
+        mask = cv2.dilate(mask.astype(np.uint8), kernel).astype(bool)
+
+    # Header/footer bands (template rows in the top/bottom band_ratio of the page) are cropped,
+    # but never past a row where some page had writing once the template is removed
+    writing_rows = np.zeros(h, dtype=bool)
+    for gray in gray_pages:
+        if gray.shape != (h, w):
+            gray = cv2.resize(gray, (w, h), interpolation=cv2.INTER_AREA)
+        writing_rows |= ((gray < ink_threshold) & ~mask).any(axis=1)
+    band = int(band_ratio * h)
+    header_rows = _box_rows(mask, 0, band)
+    footer_rows = _box_rows(mask, h - band, h)
+    writing_rows[header_rows] = False  # filled-in 'Date'/'Page' fields share rows with the printed boxes
+    writing_rows[footer_rows] = False
+    writing = np.flatnonzero(writing_rows)
+    crop_top = int(header_rows[-1]) + 1 if header_rows.size else 0
+    crop_bottom = int(footer_rows[0]) if footer_rows.size else h
+    if writing.size:
+        crop_top = min(crop_top, int(writing[0]))
+        crop_bottom = max(crop_bottom, int(writing[-1]) + 1)
+    return make_template(mask, crop_top, crop_bottom)
+
+
+def make_template(mask, crop_top, crop_bottom):
+    template_id = hashlib.sha256(np.packbits(mask).tobytes() + f"{crop_top}:{crop_bottom}".encode()).hexdigest()[:12]
+    return {"mask": mask, "crop_top": crop_top, "crop_bottom": crop_bottom, "id": template_id}
+
+
+def save_template(path, template):
+    np.savez_compressed(path, mask=template["mask"], crop=np.array([template["crop_top"], template["crop_bottom"]]))
+
+
+def load_template(path):
+    data = np.load(path)
+    crop_top, crop_bottom = (int(v) for v in data["crop"])
+    return make_template(data["mask"], crop_top, crop_bottom)
+
+
+# === Blank the template pixels and crop the template-only bands of one grayscale page ===
+def apply_template(gray, template, crop=True):
+    mask = template["mask"]
+    h, w = gray.shape
+    scale = h / mask.shape[0]
+    if mask.shape != (h, w):  # pages of the same layout can be off by a pixel after resizing
+        mask = cv2.resize(mask.astype(np.uint8), (w, h), interpolation=cv2.INTER_NEAREST).astype(bool)
+    masked = gray.copy()
+    masked[mask] = 255
+    if crop:
+        top, bottom = int(template["crop_top"] * scale), int(round(template["crop_bottom"] * scale))
+        masked = masked[top:max(bottom, top + 1)]
+    return masked
+
+
+# === transform callable for the preprocessing stage ===
+def template_transform(template, crop=True):
+    return lambda gray: apply_template(gray, template, crop=crop)
+
+
+# === Learn from every page of the given PDFs ===
+def learn_from_pdfs(pdf_paths, dim=dim):
+    pages = []
+    for pdf_path in pdf_paths:
+        for _, pix, array in iter_page_arrays(pdf_path, dim=dim, gray=True):
+            pages.append(resize_gray(array, dim).copy())  # copy: the view dies with the pixmap
+    return learn_template(pages)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4 or sys.argv[1] != "learn":
+        print("usage: python template_mask.py learn <template.npz> <pdf> [<pdf> ...]")
+        sys.exit(1)
+    template = learn_from_pdfs(sys.argv[3:])
+    save_template(sys.argv[2], template)
+    mask = template["mask"]
+    print(f"✅ Template {template['id']} saved to {sys.argv[2]}: {mask.mean():.1%} of pixels masked, "
+          f"rows {template['crop_top']}..{template['crop_bottom']} of {mask.shape[0]} kept")
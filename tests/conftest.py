@@ -0,0 +1,20 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # the modules live at the repo root
+
+# keep test runs out of the real response cache and usage log
+os.environ.setdefault("RESPONSE_CACHE", "bypass")
+os.environ.setdefault("USAGE_LOG", os.path.join(tempfile.mkdtemp(), "usage.jsonl"))
+
+
+# === Offline gemini (mock_gemini) with no latency and no replayed answers, records kept in tmp_path ===
+@pytest.fixture
+def gemini(tmp_path, monkeypatch):
+    import mock_gemini
+    monkeypatch.setattr(mock_gemini, "mock_usage_path", str(tmp_path / "usage_mock.jsonl"))
+    monkeypatch.setattr(mock_gemini, "mock_upload_index_path", str(tmp_path / "uploads_mock.sqlite"))
+    return mock_gemini.install(latency_scale=0, replay_path=None)
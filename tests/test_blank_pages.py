@@ -0,0 +1,37 @@
+import numpy as np
+import cv2
+
+from blank_pages import blank_page_stats, is_blank_page
+
+
+def _page():
+    return np.full((768, 543), 255, np.uint8)
+
+
+def _blank(page):
+    return is_blank_page(blank_page_stats(page))
+
+
+def test_empty_page_is_blank():
+    assert _blank(_page())
+
+
+def test_scan_specks_are_blank():
+    page = _page()
+    for y, x in ((100, 80), (400, 300), (650, 200)):
+        page[y:y + 2, x:x + 2] = 0
+    assert _blank(page)
+
+
+def test_diagram_only_page_is_kept():
+    page = _page()
+    cv2.line(page, (100, 600), (450, 600), 0, 2)  # x axis
+    cv2.line(page, (100, 600), (100, 200), 0, 2)  # y axis
+    cv2.circle(page, (280, 400), 90, 0, 2)
+    assert not _blank(page)
+
+
+def test_single_digit_page_is_kept():
+    page = _page()
+    cv2.putText(page, "7", (250, 300), cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+    assert not _blank(page)
@@ -0,0 +1,35 @@
+import numpy as np
+import cv2
+from PIL import Image
+
+from image_preprocessing import encode_image, encode_within_budget, jpeg_quality_range
+
+
+def _page():
+    page = np.full((768, 543), 255, np.uint8)
+    for line in range(20):
+        cv2.putText(page, f"{line + 1}. v^2 = u^2 + 2as, s = 12.5 m", (20, 40 + 35 * line), cv2.FONT_HERSHEY_SIMPLEX,
+                    0.7, 0, 2)
+    return Image.fromarray(page)
+
+
+def test_jpeg_gets_the_highest_quality_that_fits():
+    page = _page()
+    budget = len(encode_image(page, quality=70))
+    data, quality = encode_within_budget(page, max_bytes=budget)
+    assert len(data) <= budget and quality >= 70
+    assert len(encode_image(page, quality=quality + 1)) > budget
+
+
+def test_unreachable_budget_falls_back_to_the_smallest_setting():
+    data, quality = encode_within_budget(_page(), max_bytes=100)
+    assert quality == jpeg_quality_range[0] and len(data) > 100
+
+
+def test_png_gets_the_fastest_level_that_fits():
+    page = _page()
+    sizes = {level: len(encode_image(page, fmt="PNG", compress_level=level)) for level in range(1, 10)}
+    budget = sizes[4]
+    data, level = encode_within_budget(page, fmt="PNG", max_bytes=budget)
+    assert len(data) <= budget and sizes[level - 1] > budget
+    assert data.startswith(b"\x89PNG")
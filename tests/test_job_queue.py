@@ -0,0 +1,73 @@
+import os
+import time
+import threading
+
+import job_queue
+from job_queue import JobQueue, run_jobs
+
+
+def _queue(tmp_path, name="pdfs", **kwargs):
+    return JobQueue(name, path=str(tmp_path / "jobs.sqlite"), **kwargs)
+
+
+def test_each_item_is_claimed_once_across_processes(tmp_path):
+    queues = [_queue(tmp_path), _queue(tmp_path)]  # two connections, like two notebooks on the same file
+    queues[1].owner = "other-host:1"
+    queues[0].add(f"{i:02}.pdf" for i in range(20))
+    claimed = []
+
+    def claim_all(queue):
+        while (item := queue.claim()) is not None:
+            claimed.append(item)
+
+    threads = [threading.Thread(target=claim_all, args=(queues[i % 2],)) for i in range(8)]
+    [thread.start() for thread in threads]
+    [thread.join() for thread in threads]
+    assert sorted(claimed) == [f"{i:02}.pdf" for i in range(20)]
+
+
+def test_claim_is_limited_to_the_given_items(tmp_path):
+    queue = _queue(tmp_path)
+    queue.add(["a.pdf", "b.pdf"])
+    assert queue.claim(["b.pdf"]) == "b.pdf"
+    assert queue.claim(["b.pdf"]) is None
+
+
+def test_failed_item_waits_for_its_backoff_then_runs_out_of_attempts(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    queue.add(["a.pdf"])
+    queue.fail(queue.claim(), ValueError("quota"))
+    assert queue.claim() is None and 0 < queue.next_retry_in() <= job_queue.retry_delay(1)
+    queue._db.execute("UPDATE jobs SET next_attempt = 0")
+    queue.fail(queue.claim(), ValueError("quota"))
+    assert queue.claim() is None and queue.next_retry_in() is None
+    assert queue.resume() == 1 and queue.claim() == "a.pdf"
+
+
+def test_recover_requeues_rows_of_dead_and_interrupted_runs(tmp_path):
+    queue = _queue(tmp_path)
+    queue.add(["dead.pdf", "interrupted.pdf", "alive.pdf"])
+    for item, owner in (("dead.pdf", f"{job_queue._host}:999999999"), ("interrupted.pdf", queue.owner),
+                        ("alive.pdf", f"{job_queue._host}:{os.getppid()}")):
+        queue._db.execute("UPDATE jobs SET status = 'running', owner = ?, started = ? WHERE item = ?",
+                          (owner, time.time(), item))
+    assert queue.recover() == 2  # a live process keeps its rows until stale_after
+    assert queue.pending() == ["alive.pdf", "dead.pdf", "interrupted.pdf"]
+    assert queue.counts()["running"] == 1
+
+
+def test_run_jobs_retries_a_failure_and_finishes(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue, "retry_base_delay", 0)
+    queue = _queue(tmp_path)
+    queue.add(["a.pdf", "b.pdf", "c.pdf"])
+    calls = []
+
+    def worker(item):
+        calls.append(item)
+        if calls.count(item) == 1 and item == "b.pdf":
+            raise ConnectionError("reset")
+        return str(tmp_path / item)
+
+    counts = run_jobs(queue, worker, concurrency=2, items=["a.pdf", "b.pdf"])
+    assert counts == {"pending": 1, "running": 0, "done": 2, "failed": 0}
+    assert sorted(calls) == ["a.pdf", "b.pdf", "b.pdf"]
@@ -0,0 +1,51 @@
+import json
+
+import rate_limiter
+from mock_gemini import MockGenerativeModel
+from model_cascade import ModelCascade, _p
+
+
+class _SteadyFlash:  # both fast samples read the page identically
+    model_name = "models/gemini-2.5-flash"
+
+    def generate_content(self, contents, **kwargs):
+        items = [{"question_number": "1", "ocr_text": "v = u + at, t = 2.5 s", "diagrams": [], "pages": [1]}]
+        return type("Response", (), {"text": json.dumps(items), "usage_metadata": None})()
+
+
+def _pages(count):
+    return [{"page": n, "bytes": f"page {n}".encode()} for n in range(1, count + 1)]
+
+
+def _models(log):
+    return [[call["model"] for call in entry["calls"]] for entry in log["pages"]]
+
+
+def test_agreeing_fast_samples_never_reach_the_strong_model(gemini):
+    results, log = ModelCascade(_SteadyFlash(), MockGenerativeModel("gemini-2.5-pro"), "prompt").run(_pages(2))
+    assert _models(log) == [["gemini-2.5-flash"] * 2] * 2
+    assert gemini.stats["requests"] == 0
+    assert [item["pages"] for item in results] == [[1], [2]]
+
+
+def test_disagreeing_fast_samples_escalate(gemini):
+    fast, strong = MockGenerativeModel("gemini-2.5-flash"), MockGenerativeModel("gemini-2.5-pro")
+    _, log = ModelCascade(fast, strong, "prompt").run(_pages(1))  # the mock draws different text per sample
+    entry = log["pages"][0]
+    assert entry["escalated"] and entry["checks"]["sample_cer"] > 0
+    assert _models(log) == [["gemini-2.5-flash", "gemini-2.5-flash", "gemini-2.5-pro"]]
+
+
+def test_failed_page_is_recorded_and_the_run_goes_on(gemini, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "max_retries", 0)
+    gemini.error_rate = 1.0
+    # baseline sends every page to the strong model too, which only ever answers 429
+    results, log = ModelCascade(_SteadyFlash(), MockGenerativeModel("gemini-2.5-pro"), "prompt",
+                                baseline=True).run(_pages(2))
+    assert [entry["questions"] for entry in log["pages"]] == [0, 0]
+    assert [(item["pages"], item["error"].split(":")[0]) for item in results] == [
+        ([1], "MockResourceExhausted"), ([2], "MockResourceExhausted")]
+
+
+def test_p95_stays_inside_a_small_sample():
+    assert _p([1.0, 2.0, 3.0], 95) <= 3.0
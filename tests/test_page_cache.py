@@ -0,0 +1,25 @@
+import os
+
+from page_cache import PageCache
+
+
+def test_least_recently_used_page_is_evicted_first(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=250)
+    cache.put("a", b"x" * 100)
+    cache.put("b", b"x" * 100)
+    cache._entries["a"][1], cache._entries["b"][1] = 1, 2  # b was written after a
+    assert cache.get("a") == b"x" * 100  # ... but a was read since
+    cache.put("c", b"x" * 100)
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
+    assert cache.get("b") is None and cache.total_bytes == 200
+
+
+def test_access_order_survives_a_restart(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=250)
+    cache.put("old", b"x" * 100)
+    cache.put("new", b"x" * 100)
+    os.utime(tmp_path / "old", (1, 1))
+    restarted = PageCache(str(tmp_path), max_bytes=250)
+    assert restarted.total_bytes == 200
+    restarted.put("third", b"x" * 100)
+    assert sorted(os.listdir(tmp_path)) == ["new", "third"]
@@ -0,0 +1,42 @@
+import json
+
+from page_windows import merge_window_results, stream_window_questions
+
+
+def _window(pages, items):
+    return {"pages": pages, "text": json.dumps(items)}
+
+
+def test_numbered_question_is_stitched_across_windows():
+    merged, failed = merge_window_results([
+        _window([1, 2], [{"question_number": "3", "ocr_text": "A ball is thrown upwards with speed u", "pages": [2]}]),
+        _window([2, 3], [{"question_number": "3", "ocr_text": "with speed u and reaches height h", "pages": [2]}]),
+    ])
+    assert failed == []
+    assert len(merged) == 1 and merged[0]["pages"] == [2, 3]
+
+
+def test_unnumbered_items_are_not_merged():
+    merged, _ = merge_window_results([
+        _window([1, 2], [{"ocr_text": "rough work", "pages": [2]}]),
+        _window([2, 3], [{"question_number": "na", "ocr_text": "a diagram of a pulley", "pages": [1]},
+                         {"question_number": "", "ocr_text": "continued working", "pages": [2]}]),
+    ])
+    assert [item["ocr_text"] for item in merged] == ["rough work", "a diagram of a pulley", "continued working"]
+
+
+class _BrokenStream:
+    model_name = "models/gemini-2.5-flash"
+
+    def generate_content(self, contents, stream=False, **kwargs):
+        def chunks():
+            yield type("Chunk", (), {"text": '[{"question_number": "1", "ocr_text": "F = ma", "pages": [1]}, '})()
+            raise ConnectionError("stream reset")
+        return chunks()
+
+
+def test_questions_seen_before_a_stream_error_survive_the_merge():
+    events = list(stream_window_questions(_BrokenStream(), "prompt", [[1, 2]], {1: "page 1", 2: "page 2"}))
+    assert [event[0] for event in events] == ["question", "error", "window"]
+    merged, failed = merge_window_results([events[-1][1]])
+    assert failed == [] and [item["ocr_text"] for item in merged] == ["F = ma"]
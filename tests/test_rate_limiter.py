@@ -0,0 +1,58 @@
+import pytest
+
+import rate_limiter
+from mock_gemini import MockResourceExhausted
+from rate_limiter import RateLimiter, TokenBucket, generate_with_limits, get_limiter
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate():
+    bucket = TokenBucket(60)  # 1 per second, 10 s of burst
+    waits = [bucket.reserve(1, now=bucket.updated) for _ in range(12)]
+    assert waits[:10] == [0.0] * 10 and waits[10:] == pytest.approx([1.0, 2.0])
+    assert bucket.reserve(1, now=bucket.updated + 5) == pytest.approx(0.0)  # 5 s refilled what the 2 extra took
+
+
+def test_throttling_slows_the_buckets_and_success_wins_the_rate_back():
+    limiter = RateLimiter(60, 60_000)
+    limiter.on_throttle(0)
+    assert limiter.stats()["requests_per_minute"] == pytest.approx(60 * rate_limiter.throttle_factor)
+    for _ in range(100):
+        limiter.on_success(100)
+    assert limiter.stats() == {"requests_per_minute": 60, "tokens_per_minute": 60_000, "throttled": 1}
+
+
+def test_backoff_doubles_with_jitter_up_to_the_cap():
+    limiter = RateLimiter(60, 60_000)
+    for attempt in range(10):
+        cap = min(rate_limiter.max_delay, rate_limiter.base_delay * 2 ** attempt)
+        assert cap / 2 <= limiter.on_throttle(attempt) <= cap
+
+
+class _Flaky:
+    def __init__(self, model_name, errors):
+        self.model_name = model_name
+        self.errors = list(errors)
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "answer"
+
+
+def test_429s_are_retried_after_a_backoff(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(rate_limiter.time, "sleep", sleeps.append)
+    model = _Flaky("models/test-retry", [MockResourceExhausted("429"), MockResourceExhausted("429")])
+    assert generate_with_limits(model, ["prompt"]) == "answer"
+    assert model.calls == 3 and len(sleeps) == 2
+    assert get_limiter(model.model_name).throttled == 2
+
+
+def test_other_errors_are_raised_without_retrying(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, "sleep", lambda seconds: None)
+    model = _Flaky("models/test-no-retry", [ValueError("bad request")])
+    with pytest.raises(ValueError):
+        generate_with_limits(model, ["prompt"])
+    assert model.calls == 1
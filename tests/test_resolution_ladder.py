@@ -0,0 +1,30 @@
+import fitz
+
+from mock_gemini import MockGenerativeModel
+from resolution_ladder import ResolutionScheduler
+
+
+def _pdf(tmp_path):
+    doc = fitz.open()
+    page = doc.new_page()
+    for line in range(5):
+        page.insert_text((72, 72 + 20 * line), f"{line + 1}. A ball of mass m is thrown up with speed u", fontsize=12)
+    doc.new_page()  # blank
+    path = str(tmp_path / "answers.pdf")
+    doc.save(path)
+    return path
+
+
+def test_page_that_passes_stays_on_the_lowest_rung(gemini, tmp_path):
+    results, log = ResolutionScheduler(MockGenerativeModel("gemini-2.5-flash"), "prompt").run(_pdf(tmp_path))
+    assert [(entry["page"], entry["blank"], entry["final_dim"], entry["escalated"]) for entry in log] == [
+        (1, False, 768, False), (2, True, None, False)]
+    assert gemini.stats["requests"] == 1  # the blank page is never sent
+    assert {item["pages"][0] for item in results} == {1, 2}
+
+
+def test_invalid_json_climbs_to_the_top_rung(gemini, tmp_path):
+    gemini.truncate_rate = 1.0
+    _, log = ResolutionScheduler(MockGenerativeModel("gemini-2.5-flash"), "prompt").run(_pdf(tmp_path))
+    assert [attempt["json_valid"] for attempt in log[0]["attempts"]] == [False, False]
+    assert log[0]["final_dim"] == 1536 and log[0]["escalated"]
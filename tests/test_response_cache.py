@@ -0,0 +1,19 @@
+from types import SimpleNamespace
+
+from response_cache import request_key
+
+
+def _model(generation_config=None, system_instruction=None):
+    return SimpleNamespace(model_name="models/gemini-2.5-pro", _generation_config=generation_config or {},
+                           _system_instruction=system_instruction)
+
+
+def test_unconfigured_model_keys_like_its_name():
+    assert request_key(_model(), ["prompt"]) == request_key("gemini-2.5-pro", ["prompt"])
+
+
+def test_model_config_is_part_of_the_key():
+    plain = request_key(_model(), ["prompt"])
+    schema = request_key(_model({"response_mime_type": "application/json"}), ["prompt"])
+    instructed = request_key(_model(system_instruction="Only JSON"), ["prompt"])
+    assert len({plain, schema, instructed}) == 3
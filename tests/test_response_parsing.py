@@ -0,0 +1,21 @@
+from response_parsing import parse_json_list
+
+
+def test_prose_before_list():
+    raw = 'Here is the JSON:\n[{"question_number": "1", "ocr_text": "F = ma", "pages": [1]}]'
+    assert parse_json_list(raw) == [{"question_number": "1", "ocr_text": "F = ma", "pages": [1]}]
+
+
+def test_prose_before_truncated_list():
+    raw = 'Here is the JSON:\n[{"question_number": "1", "pages": [1]}, {"question_number": "2", "ocr_te'
+    assert parse_json_list(raw) == [{"question_number": "1", "pages": [1]}]
+
+
+def test_objects_without_list_opener():
+    raw = '{"question_number": "1", "pages": [1]}, {"question_number": "2", "pages": [2]}'
+    assert [item["question_number"] for item in parse_json_list(raw)] == ["1", "2"]
+
+
+def test_code_fence():
+    raw = '```json\n[{"question_number": "1"}]\n```'
+    assert parse_json_list(raw, repair=False) == [{"question_number": "1"}]
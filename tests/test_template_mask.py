@@ -0,0 +1,33 @@
+import numpy as np
+import cv2
+
+from template_mask import learn_template, apply_template
+
+
+def _sheet(margin_line=True, writing_row=None, seed=0):
+    page = np.full((700, 500), 255, np.uint8)
+    cv2.rectangle(page, (60, 10), (440, 40), 0, 2)  # printed header box
+    cv2.rectangle(page, (60, 660), (440, 690), 0, 2)  # printed footer box
+    if margin_line:
+        cv2.line(page, (30, 0), (30, 699), 0, 2)
+    rng = np.random.default_rng(seed)
+    cv2.putText(page, "answer", (int(rng.integers(60, 300)), int(rng.integers(150, 600))),
+                cv2.FONT_HERSHEY_SIMPLEX, 1, 0, 2)
+    if writing_row is not None:
+        cv2.putText(page, "x = 5", (100, writing_row), cv2.FONT_HERSHEY_SIMPLEX, 0.8, 0, 2)
+    return page
+
+
+def test_margin_line_does_not_crop_writing_in_header_band():
+    pages = [_sheet(seed=seed) for seed in range(5)] + [_sheet(writing_row=70, seed=5)]
+    template = learn_template(pages)
+    assert 40 < template["crop_top"] <= 50  # the header box is still cropped...
+    assert template["crop_bottom"] >= 655
+    kept = apply_template(pages[-1], template)
+    assert (kept[:70 - template["crop_top"]] < 160).any()  # ...but the writing below it is kept
+
+
+def test_header_box_is_cropped_without_margin_line():
+    template = learn_template([_sheet(margin_line=False, seed=seed) for seed in range(5)])
+    assert 40 < template["crop_top"] <= 50
+    assert 655 <= template["crop_bottom"] < 662
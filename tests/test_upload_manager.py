@@ -0,0 +1,48 @@
+import time
+
+
+def _manager(tmp_path):
+    from upload_manager import UploadManager  # after the gemini fixture, genai is the mock
+    return UploadManager(str(tmp_path / "uploads.sqlite"), workers=2)
+
+
+def _pdf(tmp_path, name="a.pdf", data=b"%PDF-1.4 answers"):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_same_content_is_uploaded_once(gemini, tmp_path):
+    manager = _manager(tmp_path)
+    first = manager.get(_pdf(tmp_path))
+    again = manager.get(_pdf(tmp_path, "copy.pdf"))
+    assert again.name == first.name
+    assert (manager.uploaded, manager.reused) == (1, 1)
+
+
+def test_file_about_to_expire_is_uploaded_again(gemini, tmp_path):
+    from upload_manager import expiry_margin
+    manager = _manager(tmp_path)
+    path = _pdf(tmp_path)
+    manager.get(path)
+    manager._db.execute("UPDATE uploads SET expires = ?", (time.time() + expiry_margin / 2,))
+    manager.get(path)
+    assert (manager.uploaded, manager.reused) == (2, 0)
+
+
+def test_file_deleted_remotely_is_uploaded_again(gemini, tmp_path):
+    manager = _manager(tmp_path)
+    path = _pdf(tmp_path)
+    gemini.delete_file(manager.get(path).name)
+    manager.get(path)
+    assert (manager.uploaded, manager.reused) == (2, 0)
+
+
+def test_cleanup_drops_expired_entries_and_deletes_idle_files(gemini, tmp_path):
+    manager = _manager(tmp_path)
+    manager.get(_pdf(tmp_path, "old.pdf", b"%PDF old"))
+    manager._db.execute("UPDATE uploads SET expires = ?", (time.time() - 1,))
+    idle = manager.get(_pdf(tmp_path, "idle.pdf", b"%PDF idle"))
+    assert manager.cleanup(idle_hours=0) == 1
+    assert manager.stats()["indexed"] == 0
+    assert idle.name not in [file.name for file in gemini.list_files()]
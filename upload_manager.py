@@ -0,0 +1,187 @@
+#deduplicated genai.upload_file: uploads are indexed by content sha256 in a local sqlite file together with
+#their expiry, live handles are reused instead of re-uploading, uploads can be started ahead of generation
+#on a thread pool, and expired / unused remote files are deleted in bulk
+#usage: python upload_manager.py cleanup [--idle-hours N] [--all]
+import os
+import sys
+import time
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import google.generativeai as genai
+
+default_index_path = os.path.join(os.path.expanduser("~"), ".cache", "subjective_grading", "uploads.sqlite")
+default_ttl = 47 * 3600  # gemini keeps files 48 h, used when the File has no expiration_time
+expiry_margin = 3600  # don't hand out a file that expires within the hour
+upload_workers = 4
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _expires(file):
+    expiration = getattr(file, "expiration_time", None)
+    return expiration.timestamp() if expiration else time.time() + default_ttl
+
+
+class UploadManager:
+    def __init__(self, index_path=default_index_path, workers=upload_workers):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        self.reused = 0
+        self.uploaded = 0
+        self._lock = threading.Lock()
+        self._pending = {}  # sha -> Future of an upload in flight, so the same content is never uploaded twice at once
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._db = sqlite3.connect(index_path, check_same_thread=False, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS uploads (
+            sha TEXT PRIMARY KEY, name TEXT, mime_type TEXT, path TEXT, expires REAL, last_used REAL)""")
+        self._db.commit()
+
+    def _lookup(self, sha):
+        with self._lock:
+            return self._db.execute("SELECT name, expires FROM uploads WHERE sha = ?", (sha,)).fetchone()
+
+    def _record(self, sha, file, mime_type, path):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?)",
+                             (sha, file.name, mime_type, path, _expires(file), time.time()))
+            self._db.commit()
+
+    def _forget(self, sha):
+        with self._lock:
+            self._db.execute("DELETE FROM uploads WHERE sha = ?", (sha,))
+            self._db.commit()
+
+    # === Live remote handle for this content, or None ===
+    def _reuse(self, sha):
+        row = self._lookup(sha)
+        if row is None:
+            return None
+        name, expires = row
+        if expires - expiry_margin < time.time():
+            self._forget(sha)
+            return None
+        try:
+            file = genai.get_file(name)
+        except Exception:  # deleted remotely or already gone
+            self._forget(sha)
+            return None
+        with self._lock:
+            self._db.execute("UPDATE uploads SET last_used = ? WHERE sha = ?", (time.time(), sha))
+            self._db.commit()
+        return file
+
+    def _upload(self, path, mime_type, sha):
+        file = self._reuse(sha)
+        if file is not None:
+            self.reused += 1
+            return file
+        file = genai.upload_file(path, mime_type=mime_type)
+        while getattr(getattr(file, "state", None), "name", "ACTIVE") == "PROCESSING":
+            time.sleep(1)
+            file = genai.get_file(file.name)
+        self._record(sha, file, mime_type, path)
+        self.uploaded += 1
+        return file
+
+    # === Start (or join) the upload of one file, returns a Future of the File ===
+    def submit(self, path, mime_type="application/pdf"):
+        sha = file_sha256(path)
+        with self._lock:
+            future = self._pending.get(sha)
+            if future is not None:
+                return future
+            future = self._pool.submit(self._upload, path, mime_type, sha)
+            self._pending[sha] = future
+        # only in-flight uploads are shared; a finished one goes back through _reuse, which checks the expiry
+        # and that the file still exists, so a multi-day run never keeps handing out a dead File
+        future.add_done_callback(lambda done: self._done(sha, done))
+        return future
+
+    def _done(self, sha, future):
+        with self._lock:
+            if self._pending.get(sha) is future:
+                del self._pending[sha]
+
+    # === Upload everything ahead of generation; get() later just waits for the matching future ===
+    def prefetch(self, paths, mime_type="application/pdf"):
+        return [self.submit(path, mime_type) for path in paths]
+
+    def get(self, path, mime_type="application/pdf"):
+        return self.submit(path, mime_type).result()
+
+    # === Bulk cleanup: drop expired index entries, delete remote files idle longer than idle_hours ===
+    def cleanup(self, idle_hours=None):
+        now = time.time()
+        with self._lock:
+            self._db.execute("DELETE FROM uploads WHERE expires < ?", (now,))
+            rows = []
+            if idle_hours is not None:
+                rows = self._db.execute("SELECT sha, name FROM uploads WHERE last_used < ?",
+                                        (now - idle_hours * 3600,)).fetchall()
+            self._db.commit()
+        deleted = self._delete([name for _, name in rows])
+        for sha, name in rows:
+            if name in deleted:
+                self._forget(sha)
+        return len(deleted)
+
+    # === Delete every remote file of this API key, indexed or not (orphans from before the index) ===
+    def cleanup_all(self):
+        deleted = self._delete([file.name for file in genai.list_files()])
+        with self._lock:
+            self._db.execute("DELETE FROM uploads")
+            self._db.commit()
+        return len(deleted)
+
+    def _delete(self, names):
+        def delete(name):
+            try:
+                genai.delete_file(name)
+                return name
+            except Exception as e:
+                print(f"❌ Failed to delete {name}: {e}")
+                return None
+        return {name for name in self._pool.map(delete, names) if name}
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+        return {"uploaded": self.uploaded, "reused": self.reused, "indexed": entries}
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+# === The one upload manager for this process ===
+def get_upload_manager():
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = UploadManager()
+        return _manager
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "cleanup":
+        print("usage: python upload_manager.py cleanup [--idle-hours N] [--all]")
+        sys.exit(1)
+    from dotenv import load_dotenv
+    load_dotenv()
+    from model_pool import configure_once
+    configure_once()
+    manager = get_upload_manager()
+    if "--all" in sys.argv:
+        print(f"🧹 Deleted {manager.cleanup_all()} remote files")
+    else:
+        idle_hours = float(sys.argv[sys.argv.index("--idle-hours") + 1]) if "--idle-hours" in sys.argv else 0
+        print(f"🧹 Deleted {manager.cleanup(idle_hours=idle_hours)} remote files idle for {idle_hours} h")
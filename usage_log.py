@@ -0,0 +1,197 @@
+#per-request accounting for capacity planning: every model call that goes through rate_limiter appends one JSONL
+#line with prompt / candidate / total tokens from usage_metadata, image + page count, request bytes, latency,
+#retries and the run's tags (subject, prompt version), and the summarizer reports p50/p95/p99 and tokens per page
+#usage: python usage_log.py summary [log path] [--by model,prompt_version,subject]
+import os
+import sys
+import json
+import time
+import hashlib
+import statistics
+import threading
+from datetime import datetime
+
+import fitz  # PyMuPDF, page counts of inline PDFs
+from PIL import Image
+
+default_usage_path = os.getenv("USAGE_LOG") or os.path.join(
+    os.path.expanduser("~"), ".cache", "subjective_grading", "usage.jsonl")
+default_group_by = ("model", "prompt_version", "subject")
+
+usage_tags = {}  # process-wide, e.g. {"subject": "Physics", "prompt_version": "v15"} - see tag_usage
+
+
+# === Tag every following request of this process (notebook / script level, so worker threads see it too) ===
+def tag_usage(**tags):
+    usage_tags.update({key: value for key, value in tags.items() if value is not None})
+
+
+# === Image count, page count (None when a part's pages are unknown, e.g. an uploaded file) and bytes sent ===
+def request_stats(contents):
+    parts = contents if isinstance(contents, (list, tuple)) else [contents]
+    images, pages, size, prompt = 0, 0, 0, None
+    for part in parts:
+        if isinstance(part, str):
+            size += len(part.encode("utf-8"))
+            prompt = prompt or part
+        elif isinstance(part, (bytes, bytearray)):
+            size += len(part)
+        elif isinstance(part, dict) and "data" in part:
+            size += len(part["data"])
+            if str(part.get("mime_type", "")).startswith("image/"):
+                images += 1
+            elif part.get("mime_type") == "application/pdf" and pages is not None:
+                with fitz.open(stream=bytes(part["data"]), filetype="pdf") as doc:
+                    pages += doc.page_count
+        elif isinstance(part, Image.Image):
+            images += 1
+            size += part.width * part.height * len(part.getbands())  # before the SDK encodes it
+        else:  # uploaded genai File
+            size += getattr(part, "size_bytes", 0) or 0
+            if str(getattr(part, "mime_type", "")).startswith("image/"):
+                images += 1
+            else:
+                pages = None
+    return {
+        "images": images,
+        "pages": pages + images if pages is not None else None,
+        "request_bytes": size,
+        "prompt_hash": hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12] if prompt else None,
+    }
+
+
+def usage_counts(response):
+    usage = getattr(response, "usage_metadata", None)
+    counts = {field: getattr(usage, f"{field}_token_count", None) for field in ("prompt", "candidates", "total")}
+    return {f"{field}_tokens": value if isinstance(value, int) else None for field, value in counts.items()}
+
+
+class UsageLog:
+    def __init__(self, path=default_usage_path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.records = []  # this process's calls, for end-of-run summaries
+        self._lock = threading.Lock()
+
+    # === One model call; response None when it failed ===
+    def record(self, model_name, contents, response, seconds, retries=0, error=None, **extra):
+        stats = request_stats(contents)
+        entry = {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "model": model_name.split("/")[-1],
+            "subject": usage_tags.get("subject"),
+            "prompt_version": usage_tags.get("prompt_version") or stats.pop("prompt_hash"),
+            **{key: value for key, value in stats.items() if key != "prompt_hash"},
+            **usage_counts(response),
+            "seconds": round(seconds, 3),
+            "retries": retries,
+            "error": error.__class__.__name__ if error is not None else None,
+            **extra,
+        }
+        line = json.dumps(entry)
+        with self._lock:
+            self.records.append(entry)
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+        return entry
+
+
+_log = None
+_log_lock = threading.Lock()
+
+
+# === The one usage log for this process ===
+def get_usage_log():
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = UsageLog()
+        return _log
+
+
+# === A streamed response that records its usage once fully consumed (usage_metadata arrives with the last chunk) ===
+class LoggedStream:
+    def __init__(self, response, model_name, contents, start_time, retries):
+        self._response = response
+        self._args = (model_name, contents)
+        self._start_time = start_time
+        self._retries = retries
+
+    def __iter__(self):
+        first_chunk_seconds = None
+        try:
+            for chunk in self._response:
+                if first_chunk_seconds is None:
+                    first_chunk_seconds = round(time.time() - self._start_time, 3)
+                yield chunk
+        except Exception as e:
+            get_usage_log().record(*self._args, None, time.time() - self._start_time, self._retries, e, stream=True)
+            raise
+        get_usage_log().record(*self._args, self._response, time.time() - self._start_time, self._retries,
+                               stream=True, first_chunk_seconds=first_chunk_seconds)
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+def load_usage(path=default_usage_path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _percentile(values, q):
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method="inclusive")[q - 1]
+
+
+# === Per group: calls, errors, retries, latency p50/p95/p99, tokens (total, per call, per page) ===
+def summarize_usage(records, group_by=default_group_by):
+    groups = {}
+    for entry in records:
+        groups.setdefault(tuple(entry.get(key) for key in group_by), []).append(entry)
+    summary = []
+    for key, entries in sorted(groups.items(), key=lambda item: tuple(str(k) for k in item[0])):
+        ok = [e for e in entries if e.get("error") is None]
+        latency = sorted(e["seconds"] for e in ok)
+        total_tokens = [e["total_tokens"] for e in ok if e.get("total_tokens") is not None]
+        paged = [e for e in ok if e.get("total_tokens") is not None and e.get("pages")]
+        summary.append({
+            **dict(zip(group_by, key)),
+            "calls": len(entries),
+            "errors": len(entries) - len(ok),
+            "retries": sum(e.get("retries", 0) for e in entries),
+            "p50_seconds": _percentile(latency, 50),
+            "p95_seconds": _percentile(latency, 95),
+            "p99_seconds": _percentile(latency, 99),
+            "prompt_tokens": sum(e.get("prompt_tokens") or 0 for e in ok),
+            "candidates_tokens": sum(e.get("candidates_tokens") or 0 for e in ok),
+            "tokens_per_call": round(statistics.mean(total_tokens)) if total_tokens else None,
+            "tokens_per_page": round(sum(e["total_tokens"] for e in paged) / sum(e["pages"] for e in paged))
+            if paged else None,
+        })
+    return summary
+
+
+def print_usage_summary(records, group_by=default_group_by):
+    if not records:
+        print("   📊 No model calls recorded")
+        return
+    fmt = lambda v: "-" if v is None else (f"{v:.2f}" if isinstance(v, float) else str(v))
+    print("   📊 " + " | ".join(group_by) + " | calls | errors | retries | p50/p95/p99 s | tokens/call | tokens/page")
+    for row in summarize_usage(records, group_by):
+        latency = "/".join(fmt(row[f"p{q}_seconds"]) for q in (50, 95, 99))
+        print(f"      {' | '.join(fmt(row[key]) for key in group_by)} | {row['calls']} | {row['errors']} | "
+              f"{row['retries']} | {latency} | {fmt(row['tokens_per_call'])} | {fmt(row['tokens_per_page'])}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "summary":
+        print("usage: python usage_log.py summary [log path] [--by model,prompt_version,subject]")
+        sys.exit(1)
+    args = sys.argv[2:]
+    group_by = default_group_by
+    if "--by" in args:
+        group_by = tuple(args[args.index("--by") + 1].split(","))
+        del args[args.index("--by"):args.index("--by") + 2]
+    print_usage_summary(load_usage(args[0] if args else default_usage_path), group_by)
@@ -1,20 +1,20 @@
 #this is a one model py file no streamlite where image is resized sent in batches to pro using prompt3
 import os
-import fitz  # PyMuPDF for PDF processing
-from PIL import Image
 import json
-import google.generativeai as genai
+from model_pool import get_model
 from dotenv import load_dotenv
-import base64
-import time
-import numpy as np
-import cv2
+from page_pipeline import stream_pages, build_image_parts
+from blank_pages import remap_pages, blank_page_records
+from template_mask import load_template, template_transform
+from resolution_ladder import ResolutionScheduler, print_ladder_summary
+from model_cascade import ModelCascade, print_cascade_report, fast_model_name
+from response_cache import cached_generate
+from response_parsing import parse_json_list, structured_output_config
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = get_model(model_name)  # shared client, genai.configure runs once
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -42,68 +42,19 @@ pages: [2]
 
 # === Set the dimension value ===
 dim = 768  # Define the dimension value
-
-# === Resize Image Function ===
-def resize_image(image, dim=dim, save_path=None):
-    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
-    original_size = image1.shape  # (height, width, channels)
-    image1 = image1.mean(axis=2)  # Convert image to grayscale
-    h, w = image1.shape
-    if w > h:
-        new_w = dim
-        new_h = int(h * (dim / w))
-    else:
-        new_h = dim
-        new_w = int(w * (dim / h))
-    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    resized_image_pil = Image.fromarray(resized_image)
-    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
-    if save_path:
-        resized_image_pil.save(save_path)
-    return original_size, (new_h, new_w), resized_image_pil
-
-# === Load PDF, Convert Pages to Images ===
-def pdf_to_images(pdf_path, output_folder):
-    doc = fitz.open(pdf_path)
-    images = []
-    num_pages = doc.page_count
-    for i in range(num_pages):
-        page = doc.load_page(i)
-        pix = page.get_pixmap(dpi=300)
-        img_path_default = os.path.join(output_folder, f"page_{i + 1}.jpeg")
-        pix.save(img_path_default)
-        images.append(img_path_default)
-    return images, num_pages
-
-# === Load Base64 Images ===
-def load_base64_images(folder_path, num_pages):
-    b64_list = []
-    for i in range(num_pages):
-        img_filename_dim = f"DIM_{dim}_PAGE_{i + 1}.jpeg"  # Use dim variable here
-        img_filename_default = f"page_{i + 1}.jpeg"  # Old naming convention
-
-        img_path_dim = os.path.join(folder_path, img_filename_dim)
-        img_path_default = os.path.join(folder_path, img_filename_default)
-
-        if os.path.exists(img_path_dim):
-            path = img_path_dim
-        elif os.path.exists(img_path_default):
-            path = img_path_default
-        else:
-            print(f"❌ Image {img_filename_dim} or {img_filename_default} not found in {folder_path}")
-            continue
-
-        with open(path, "rb") as f:
-            b64_list.append(base64.b64encode(f.read()).decode())
-    return b64_list
+save_pages = False  # Write the resized DIM_{dim}_PAGE_N images to output_folder
+template_path = None  # .npz from "python template_mask.py learn", blanks/crops the sheet's printed header/footer
+resolution_ladder = None  # e.g. (768, 1536): one request per page at the first dim, low-confidence pages re-sent higher
+cascade = False  # one request per page to flash first, only pages failing the local checks go to model_name
 
 # === Batch send to Gemini ===
 def send_to_gemini(resized_images_objs):
     try:
-        response = model.generate_content([PROMPT] + resized_images_objs)  # Batch processing
-        raw = response.text.strip()
-        cleaned = raw.strip('```json').strip('```').strip()
-        parsed = json.loads(cleaned)
+        response = cached_generate(model, [PROMPT] + resized_images_objs,  # Batch processing
+                                   generation_config=structured_output_config)
+        parsed = parse_json_list(response.text)
+        if parsed is None:
+            print(f"❌ Malformed JSON: {response.text}")
         return parsed
     except Exception as e:
         print(f"❌ Failed to process images: {e}")
@@ -114,27 +65,47 @@ def main(pdf_file_path, output_folder):
     # Ensure the output folder exists
     os.makedirs(output_folder, exist_ok=True)
 
-    # Step 1: Convert PDF to images
-    images, num_pages = pdf_to_images(pdf_file_path, output_folder)
-
-    # Step 2: Resize images
-    resized_images = []
-    for page_num in range(len(images)):
-        img_path = images[page_num]
-        original_size, new_size, resized_image = resize_image(Image.open(img_path), dim=dim)
-        
-        # Save resized image
-        img_filename_dim = f"DIM_{dim}_PAGE_{page_num + 1}.jpeg"
-        resized_image.save(os.path.join(output_folder, img_filename_dim))
-        
-        resized_images.append(resized_image)
-
-    # Step 3: Load base64 images
-    images_b64 = load_base64_images(output_folder, len(images))
-
-    # Step 4: Send to Gemini for OCR
-    results = send_to_gemini(resized_images)
-
+    # Step 1+2: Stream pages through render -> resize/encode; only the encoded bytes are kept
+    # Disk is only an optional sink now
+    save_path_for = (lambda n: os.path.join(output_folder, f"DIM_{dim}_PAGE_{n}.jpeg")) if save_pages else None
+    # The template mask runs before blank detection, so template-only pages come out blank too
+    transform = template_transform(load_template(template_path)) if template_path else None
+
+    if resolution_ladder:
+        scheduler = ResolutionScheduler(model, PROMPT, ladder=resolution_ladder, transform=transform,
+                                        log_path=os.path.join(output_folder, "resolution_ladder.jsonl"))
+        results, ladder_log = scheduler.run(pdf_file_path)
+        print_ladder_summary(ladder_log)
+        save_results(results, output_folder)
+        return
+
+    pages = list(stream_pages(pdf_file_path, dim=dim, save_path_for=save_path_for, detect_blank=True, transform=transform))
+
+    # Blank / near-empty pages are dropped from the request and recorded in the output instead
+    kept_pages = [p for p in pages if not p["blank"]]
+    blank_page_numbers = [p["page"] for p in pages if p["blank"]]
+    if blank_page_numbers:
+        print(f"⚪ Skipping blank pages: {blank_page_numbers}")
+
+    if cascade:
+        runner = ModelCascade(get_model(fast_model_name), model, PROMPT,
+                              log_path=os.path.join(output_folder, "model_cascade.jsonl"))
+        results, cascade_log = runner.run(kept_pages)
+        print_cascade_report(cascade_log)
+        save_results(results + blank_page_records(blank_page_numbers), output_folder)
+        return
+
+    image_parts = build_image_parts(kept_pages)
+
+    # Step 3: Send to Gemini for OCR
+    results = send_to_gemini(image_parts) if image_parts else []
+    if results is not None:
+        results = remap_pages(results, [p["page"] for p in kept_pages]) + blank_page_records(blank_page_numbers)
+
+    save_results(results, output_folder)
+
+# === Save the OCR results ===
+def save_results(results, output_folder):
     if results:
         output_json_filename = f"output.json"
         json_path = os.path.join(output_folder, output_json_filename)
@@ -150,4 +121,5 @@ def main(pdf_file_path, output_folder):
 # Running the process with a given PDF file and output folder
 pdf_file_path = "/Users/simrannaik/Desktop/solution_improvement/01_1002115268961841141690701450.pdf"  # Replace with your PDF file path
 output_folder = "/Users/simrannaik/Desktop/solution_improvement/Z"  # Replace with your output folder path
-main(pdf_file_path, output_folder)
+if __name__ == "__main__":  # worker processes re-import this file
+    main(pdf_file_path, output_folder)
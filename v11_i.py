@@ -4,19 +4,21 @@
 
 import os
 from PIL import Image
+from image_preprocessing import preprocess_page
+from page_pipeline import build_image_parts
+from response_cache import cached_generate
+from response_parsing import parse_json_list
 import json
 import google.generativeai as genai
+from model_pool import get_model
 from dotenv import load_dotenv
 import base64
 import time
-import numpy as np
-import cv2
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = get_model(model_name)  # shared client, genai.configure runs once
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -45,73 +47,26 @@ If the sentence is not found in the image, return an empty list for that image (
 # === Set the dimension value ===
 dim = 768  # Define the dimension value
 
-# === Resize Image Function ===
-def resize_image(image, dim=dim, save_path=None):
-    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
-    original_size = image1.shape  # (height, width, channels)
-    image1 = image1.mean(axis=2)  # Convert image to grayscale
-    h, w = image1.shape
-    if w > h:
-        new_w = dim
-        new_h = int(h * (dim / w))
-    else:
-        new_h = dim
-        new_w = int(w * (dim / h))
-    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    resized_image_pil = Image.fromarray(resized_image)
-    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
-    if save_path:
-        resized_image_pil.save(save_path)
-    return original_size, (new_h, new_w), resized_image_pil
-
 # === Load Image ===
 def load_image(image_path):
     img = Image.open(image_path)
     return img
 
-# === Load Base64 Image ===
-def load_base64_images(folder_path, num_images):
-    b64_list = []
-    for i in range(num_images):
-        img_filename_dim = f"DIM_{dim}_IMAGE_{i + 1}.jpeg"  # Use dim variable here
-        img_path_dim = os.path.join(folder_path, img_filename_dim)
-
-        if os.path.exists(img_path_dim):
-            path = img_path_dim
-        else:
-            print(f"❌ Image {img_filename_dim} not found in {folder_path}")
-            continue
-
-        with open(path, "rb") as f:
-            b64_list.append(base64.b64encode(f.read()).decode())
-    return b64_list
-
 # === Batch send to Gemini ===
 def send_to_gemini(resized_images_objs):
     try:
         # Send request to Gemini
-        response = model.generate_content([PROMPT] + resized_images_objs)  # Batch processing
+        response = cached_generate(model, [PROMPT] + resized_images_objs)  # Batch processing
         raw_response = response.text.strip()
 
         # Print raw response for debugging
         print(f"Raw response from Gemini:\n{raw_response}")
 
-        # Clean and parse JSON response
-        # Removing unwanted characters and trying different cleaning strategies
-        cleaned = raw_response.strip('```json').strip('```').strip()
-
-        # Check if cleaned response is valid JSON
-        if cleaned.startswith("[") and cleaned.endswith("]"):
-            try:
-                # Attempt to parse the cleaned response as JSON
-                parsed = json.loads(cleaned)
-                return parsed
-            except json.JSONDecodeError as e:
-                print(f"❌ JSON decoding error: {e}")
-                return None
-        else:
-            print(f"❌ Malformed JSON: {cleaned}")
-            return None
+        # Parse the JSON list (fences stripped as prefix/suffix, complete objects salvaged from a truncated response)
+        parsed = parse_json_list(raw_response)
+        if parsed is None:
+            print(f"❌ Malformed JSON: {raw_response}")
+        return parsed
 
     except Exception as e:
         print(f"❌ Failed to process images: {e}")
@@ -125,18 +80,15 @@ def main(image_file_path, output_folder):
     # Step 1: Load Image
     img = load_image(image_file_path)
 
-    # Step 2: Resize Image
-    original_size, new_size, resized_image = resize_image(img, dim=dim)
-    
-    # Save resized image
+    # Step 2: Resize + encode once; the saved file, the base64 and the request all use the same bytes
     img_filename_dim = f"DIM_{dim}_IMAGE_1.jpeg"
-    resized_image.save(os.path.join(output_folder, img_filename_dim))
+    page = preprocess_page(img, dim, "JPEG", os.path.join(output_folder, img_filename_dim))
 
-    # Step 3: Load base64 image
-    images_b64 = load_base64_images(output_folder, 1)
+    # Step 3: Base64 image
+    images_b64 = [base64.b64encode(page["bytes"]).decode()]
 
     # Step 4: Send to Gemini for OCR
-    results = send_to_gemini([resized_image])
+    results = send_to_gemini(build_image_parts([page]))
 
     if results:
         output_json_filename = f"768_output.json"
@@ -3,13 +3,14 @@ import os
 import fitz  # PyMuPDF
 from PIL import Image
 import json
+from response_parsing import parse_json_list
 import google.generativeai as genai
+from streamlit_ocr_cache import cached_model
 from dotenv import load_dotenv
 
 # === Load API Key ===
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel('gemini-2.5-pro')
+model = cached_model('gemini-2.5-pro')  # one client per server process, not per rerun
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -104,14 +105,10 @@ if images:
             raw_response = response.text.strip()
             st.write(f"Raw Response from Gemini (Page {page_num}): {raw_response}")
 
-            # Clean the response (strip unwanted characters like backticks)
-            cleaned_response = raw_response.strip('```json').strip('```').strip()  # Remove triple backticks and any extra spaces
-
-            # Attempt to parse the cleaned JSON
-            try:
-                parsed = json.loads(cleaned_response)
-            except json.JSONDecodeError as json_error:
-                st.warning(f"❌ Failed to parse JSON for Page {page_num}: {json_error}")
+            # Parse the JSON list (``` fences removed, complete objects kept from a truncated response)
+            parsed = parse_json_list(raw_response)
+            if parsed is None:
+                st.warning(f"❌ Failed to parse JSON for Page {page_num}")
                 continue
 
             # Add results
@@ -3,14 +3,15 @@ import os
 import fitz  # PyMuPDF
 from PIL import Image
 import json
+from response_parsing import parse_json_list
 import google.generativeai as genai
+from streamlit_ocr_cache import cached_model
 from dotenv import load_dotenv
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-flash"  # Model name
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = cached_model(model_name)  # one client per server process, not per rerun
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -121,15 +122,12 @@ if images:
         raw_response = response.text.strip()
         st.write(f"Raw Response from Gemini: {raw_response}")
 
-        # Clean the response (strip unwanted characters like backticks)
-        cleaned_response = raw_response.strip('```json').strip('```').strip()  # Remove triple backticks and any extra spaces
-
-        # Attempt to parse the cleaned JSON
-        try:
-            parsed = json.loads(cleaned_response)
+        # Parse the JSON list (``` fences removed, complete objects kept from a truncated response)
+        parsed = parse_json_list(raw_response)
+        if parsed is None:
+            st.warning("❌ Failed to parse JSON")
+        else:
             results.extend(parsed)  # Append the parsed JSON data to the results list
-        except json.JSONDecodeError as json_error:
-            st.warning(f"❌ Failed to parse JSON: {json_error}")
 
     except Exception as e:
         st.warning(f"❌ Failed to process the images: {e}")
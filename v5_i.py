@@ -3,7 +3,9 @@ import os
 import fitz  # PyMuPDF
 from PIL import Image
 import json
+from response_parsing import parse_json_list
 import google.generativeai as genai
+from streamlit_ocr_cache import cached_model
 from dotenv import load_dotenv
 import streamlit.components.v1 as components
 import base64
@@ -12,8 +14,7 @@ from io import BytesIO
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-flash"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = cached_model(model_name)  # one client per server process, not per rerun
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -102,8 +103,9 @@ if uploaded_file:
             response = model.generate_content([PROMPT] + image_objects)
             raw = response.text.strip()
             st.write(f"Raw Response from Gemini: {raw}")
-            cleaned = raw.strip('```json').strip('```').strip()
-            parsed = json.loads(cleaned)
+            parsed = parse_json_list(raw)
+            if parsed is None:
+                raise ValueError("Malformed JSON")
             results.extend(parsed)
         except Exception as e:
             st.warning(f"❌ Failed to process images: {e}")
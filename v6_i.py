@@ -8,7 +8,13 @@ from dotenv import load_dotenv
 import streamlit.components.v1 as components
 import base64
 from io import BytesIO
+from page_cache import PageCache, load_pdf_pages, pdf_sha256, write_if_changed
+from page_pipeline import build_image_parts
+from streamlit_ocr_cache import cached_comparison, cached_model, prompt_version
+from model_comparison import record_latencies
+from response_parsing import parse_json_list
 
+render_workers = 4  # Number of processes used to rasterize pages
 
 # === Streamlit UI ===
 st.set_page_config(layout="wide")
@@ -72,28 +78,10 @@ images = []
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 0
 
-# Cache image loading to avoid reloading each time
-@st.cache_data
-def load_images(folder_path, num_pages):
-    image_list = []
-    for page_num in range(num_pages):
-        img_path = os.path.join(folder_path, f"page_{page_num + 1}.png")
-        image_list.append(img_path)
-    return image_list
-
-@st.cache_data(show_spinner=False)
-def load_base64_images(model_folder, num_pages):
-    b64_list = []
-    for i in range(num_pages):
-        path = os.path.join(model_folder, f"page_{i+1}.png")
-        with open(path, "rb") as f:
-            b64_list.append(base64.b64encode(f.read()).decode())
-    return b64_list
-
-# === Initialize Models Dynamically ===
-def get_model(model_name):
-    genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-    return genai.GenerativeModel(model_name)
+# === One page cache per server process ===
+@st.cache_resource
+def get_page_cache():
+    return PageCache()
 
 # === Handle upload & convert to images ===
 if uploaded_file:
@@ -109,82 +97,63 @@ if uploaded_file:
     os.makedirs(model_1_folder, exist_ok=True)
     os.makedirs(model_2_folder, exist_ok=True)
 
-    # Save the uploaded PDF in the main folder (no model subfolder)
+    # Save the uploaded PDF in the main folder (skipped on reruns when the content is unchanged)
     pdf_path = os.path.join(folder_path, uploaded_file.name)
-    with open(pdf_path, "wb") as f:
-        f.write(uploaded_file.read())
+    pdf_bytes = uploaded_file.getvalue()
+    write_if_changed(pdf_path, pdf_bytes)
 
     # === Convert PDF to Images ===
     st.info("🔄 Converting PDF to images...")
-    doc = fitz.open(pdf_path)
+    # 300 DPI PNG pages come from the page cache; only a miss renders them (across worker processes)
+    pdf_sha = pdf_sha256(pdf_bytes)
+    page_bytes = load_pdf_pages(pdf_bytes, pdf_path, get_page_cache(), dpi=300, gray=False, fmt="PNG", workers=render_workers)
 
-    # Save images directly in the main folder
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap(dpi=300)
+    # One set of pages, shared by both models
+    images = build_image_parts(page_bytes, fmt="PNG")
+    images_b64_model_1 = [base64.b64encode(data).decode() for data in page_bytes]
+    images_b64_model_2 = images_b64_model_1
 
-        # Save the images directly inside the main folder (no model subfolders for images)
-        img_path = os.path.join(folder_path, f"page_{page_num + 1}.png")
-        pix.save(img_path)  # Save image for both models (no need for model subfolders)
-
-    # Load images into cache from the main folder
-    images = load_images(folder_path, len(doc))
-    images_b64_model_1 = load_base64_images(folder_path, len(doc))
-    images_b64_model_2 = load_base64_images(folder_path, len(doc))
-
-# === Model Processing (for both models) ===
+# === Model Processing (both models at once, on the shared page set) ===
 results_1, results_2 = [], []
 
 if uploaded_file:
-    st.info(f"🤖 Sending images to {model_1_name} for text + diagram extraction...")
-    
-    # Model 1 Processing
-    json_path_1 = os.path.join(model_1_folder, f"{pdf_name}_{model_1_name}.json")
-    
-    if images:
-        try:
-            image_objects_1 = [Image.open(p) for p in images]
-            
-            # Initialize Model 1 dynamically
-            model_1 = get_model(model_1_name)  
-            
-            response_1 = model_1.generate_content([PROMPT] + image_objects_1)
-            raw_1 = response_1.text.strip()
-            cleaned_1 = raw_1.strip('```json').strip('```').strip()
-            parsed_1 = json.loads(cleaned_1)
-            results_1.extend(parsed_1)
-        except Exception as e:
-            st.warning(f"❌ Failed to process Model 1 images: {e}")
-
-    # Save Model 1 JSON output
-    if json_path_1 and results_1:
-        with open(json_path_1, "w") as f:
-            json.dump(results_1, f, indent=3)
-
-    st.info(f"🤖 Sending images to {model_2_name} for text + diagram extraction...")
-    
-    # Model 2 Processing
-    json_path_2 = os.path.join(model_2_folder, f"{pdf_name}_{model_2_name}.json")
-    
-    if images:
-        try:
-            image_objects_2 = [Image.open(p) for p in images]
-            
-            # Initialize Model 2 dynamically
-            model_2 = get_model(model_2_name)  
-            
-            response_2 = model_2.generate_content([PROMPT] + image_objects_2)
-            raw_2 = response_2.text.strip()
-            cleaned_2 = raw_2.strip('```json').strip('```').strip()
-            parsed_2 = json.loads(cleaned_2)
-            results_2.extend(parsed_2)
-        except Exception as e:
-            st.warning(f"❌ Failed to process Model 2 images: {e}")
-
-    # Save Model 2 JSON output
-    if json_path_2 and results_2:
-        with open(json_path_2, "w") as f:
-            json.dump(results_2, f, indent=3)
+    model_names = [name for name in dict.fromkeys([model_1_name, model_2_name]) if name]
+    st.info(f"🤖 Sending images to {' and '.join(model_names)} for text + diagram extraction...")
+    results_by_model, seconds_by_model, fresh = {}, {}, {}
+    if images and model_names:
+        # Each model's column fills in as soon as that model answers
+        model_columns = dict(zip(model_names, st.columns(len(model_names))))
+        models = {name: cached_model(name) for name in model_names}
+        # Memoized per (pdf hash, model, prompt version): reruns from widget clicks don't call the models again
+        for name, result in cached_comparison(pdf_sha, prompt_version(PROMPT), models, PROMPT, images,
+                                              structured=True):
+            seconds_by_model[name] = result["seconds"]
+            if not result["memoized"]:
+                fresh[name] = result
+            with model_columns[name]:
+                parsed = parse_json_list(result["text"]) if result["error"] is None else None
+                if parsed is None:
+                    error = result["error"] or f"Malformed JSON: {result['text'][:200]}"
+                    st.warning(f"❌ Failed to process {name} images: {error}")
+                    continue
+                results_by_model[name] = parsed
+                st.success(f"✅ {name}: {len(parsed)} questions in {result['seconds']:.1f} s")
+
+        # Per-model latency side by side (memoized models show their original seconds),
+        # logged only for the models that actually ran now (not on reruns)
+        if seconds_by_model:
+            st.table({name: [f"{seconds:.1f} s"] for name, seconds in seconds_by_model.items()})
+        if fresh:
+            record_latencies(os.path.join(folder_path, "model_latency.jsonl"), pdf_name, fresh)
+
+    results_1 = results_by_model.get(model_1_name, [])
+    results_2 = results_by_model.get(model_2_name, [])
+
+    # Save each model's JSON output
+    for name, folder, results in [(model_1_name, model_1_folder, results_1), (model_2_name, model_2_folder, results_2)]:
+        if results:
+            with open(os.path.join(folder, f"{pdf_name}_{name}.json"), "w") as f:
+                json.dump(results, f, indent=3)
 
 # === Model Output Toggle Buttons ===
 BOX_HEIGHT = 1000
@@ -5,19 +5,23 @@ import fitz  # PyMuPDF
 from PIL import Image
 import json
 import google.generativeai as genai
+from streamlit_ocr_cache import cached_model, prompt_version
 from dotenv import load_dotenv
 import streamlit.components.v1 as components
-import base64
+import time
 from io import BytesIO
-import numpy as np
-import cv2
-import time  # Importing time module
+from page_cache import PageCache, load_pdf_pages, pdf_sha256, write_if_changed
+from page_pipeline import build_image_parts
+from blank_pages import find_blank_pages, remap_pages, blank_page_records
+from template_mask import load_template
+from page_windows import page_windows, stream_window_questions, merge_window_results
+from response_parsing import structured_output_config
+from usage_log import summarize_usage
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = cached_model(model_name)  # one client per server process, not per rerun
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -45,25 +49,10 @@ pages: [2]
 
 # === Set the dimension value ===
 dim = 768  # Define the dimension value
-
-# === Resize Image Function ===
-def resize_image(image, dim=dim, save_path=None):
-    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
-    original_size = image1.shape  # (height, width, channels)
-    image1 = image1.mean(axis=2)  # Convert image to grayscale
-    h, w = image1.shape
-    if w > h:
-        new_w = dim
-        new_h = int(h * (dim / w))
-    else:
-        new_h = dim
-        new_w = int(w * (dim / h))
-    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    resized_image_pil = Image.fromarray(resized_image)
-    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
-    if save_path:
-        resized_image_pil.save(save_path)
-    return original_size, (new_h, new_w), resized_image_pil
+render_workers = 4  # Number of processes used to rasterize pages
+template_path = None  # .npz from "python template_mask.py learn", blanks/crops the sheet's printed header/footer
+pages_per_request = 4  # pages are OCR'd in windows of this many pages, concurrently
+window_overlap = 1  # pages shared by neighbouring windows, questions crossing a boundary are stitched back together
 
 # Streamlit Configuration
 st.set_page_config(layout="wide")
@@ -75,38 +64,20 @@ images = []
 
 if 'current_page' not in st.session_state:
     st.session_state.current_page = 0
+if 'prepared_pages' not in st.session_state:
+    st.session_state.prepared_pages = {}  # (pdf sha, dim, template) -> (page bytes, blank page numbers)
+if 'ocr_runs' not in st.session_state:
+    st.session_state.ocr_runs = {}  # (pdf sha, model, prompt version, windows) -> merged result of one streamed run
 
-@st.cache_data
-def load_images(folder_path, num_pages):
-    return [os.path.join(folder_path, f"page_{i+1}.jpeg") for i in range(num_pages)]
-
-# === load_base64_images function ===
-@st.cache_data(show_spinner=False)
-def load_base64_images(folder_path, num_pages):
-    b64_list = []
-    for i in range(num_pages):
-        # Correct naming conventions for both types of images
-        img_filename_dim = f"DIM_{dim}_PAGE_{i + 1}.jpeg"  # Use dim variable here
-        img_filename_default = f"page_{i + 1}.jpeg"  # Old naming convention
-
-        # Check for both image filenames
-        img_path_dim = os.path.join(folder_path, img_filename_dim)
-        img_path_default = os.path.join(folder_path, img_filename_default)
-
-        # Check for existence of either file
-        if os.path.exists(img_path_dim):
-            path = img_path_dim
-        elif os.path.exists(img_path_default):
-            path = img_path_default
-        else:
-            st.warning(f"❌ Image {img_filename_dim} or {img_filename_default} not found in {folder_path}")
-            continue  # Skip to next page if neither image is found
+# === One page cache per server process, so hit/miss counters survive reruns ===
+@st.cache_resource
+def get_page_cache():
+    return PageCache()
 
-        # Load the base64-encoded image
-        with open(path, "rb") as f:
-            b64_list.append(base64.b64encode(f.read()).decode())
-    
-    return b64_list
+# === Answer-sheet template, loaded once ===
+@st.cache_resource
+def get_template(path):
+    return load_template(path)
 
 
 # === Handle upload & convert to images ===
@@ -117,99 +88,45 @@ if uploaded_file:
     folder_path = os.path.join("Gemini_ocr_output", folder_name)
     os.makedirs(folder_path, exist_ok=True)
 
-    # Save the uploaded PDF file to the folder
+    # Save the uploaded PDF file to the folder (skipped on reruns when the content is unchanged)
     pdf_path = os.path.join(folder_path, uploaded_file.name)
-    with open(pdf_path, "wb") as f:
-        f.write(uploaded_file.read())
-
-    st.info("🔄 Converting PDF to images...")
-    doc = fitz.open(pdf_path)
-
-    resized_images = []  # List to store resized image objects
-
-    # Save images directly in the same folder and resize them
-    for page_num in range(len(doc)):
-        page = doc.load_page(page_num)
-        pix = page.get_pixmap(dpi=300)
-
-        # Naming conventions
-        img_filename_dim = f"DIM_{dim}_PAGE_{page_num + 1}.jpeg"
-        img_filename_default = f"page_{page_num + 1}.jpeg"
-
-        # Paths for both images
-        img_path_dim = os.path.join(folder_path, img_filename_dim)
-        img_path_default = os.path.join(folder_path, img_filename_default)
-
-        # Save the original image with the default name
-        pix.save(img_path_default)
-
-        # Now that the original image is saved, open it and resize it
-        original_size, new_size, resized_image = resize_image(Image.open(img_path_default), dim=dim)
-
-        # Save the resized image
-        resized_image.save(img_path_dim)
-
-        # Display the resize information in Streamlit
-        st.write(f"**Original Image Size (Page {page_num + 1}):** {original_size[0]}x{original_size[1]}")
-        st.write(f"**Resized Image Size (Page {page_num + 1}):** {new_size[0]}x{new_size[1]}")
-
-        resized_images.append(resized_image)  # Add resized image to list
-
-    # Update load_base64_images to use the correct naming convention
-    images_b64 = load_base64_images(folder_path, len(doc))
+    pdf_bytes = uploaded_file.getvalue()
+    write_if_changed(pdf_path, pdf_bytes)
+
+    # Pages, previews and blank detection are done once per upload, page navigation reruns reuse them
+    pdf_sha = pdf_sha256(pdf_bytes)
+    pages_key = (pdf_sha, dim, template_path)
+    if pages_key not in st.session_state.prepared_pages:
+        st.info("🔄 Converting PDF to images...")
+        # Encoded DIM_{dim} pages come from the page cache; only a miss renders (across worker processes) and resizes
+        page_cache = get_page_cache()
+        template = get_template(template_path) if template_path else None
+        page_bytes = load_pdf_pages(pdf_bytes, pdf_path, page_cache, dim=dim, fmt="JPEG", workers=render_workers,
+                                    template=template)
+        cache_stats = page_cache.stats()
+        st.write(f"**Pages:** {len(page_bytes)} | **Page cache:** {cache_stats['hits']} hits / {cache_stats['misses']} misses")
+
+        # The preview below reads DIM_{dim}_PAGE_N.jpeg, so write the encoded bytes as-is
+        for page_num, data in enumerate(page_bytes):
+            with open(os.path.join(folder_path, f"DIM_{dim}_PAGE_{page_num + 1}.jpeg"), "wb") as f:
+                f.write(data)
+
+        # Blank / near-empty pages are dropped from the request and recorded in the output instead
+        st.session_state.prepared_pages[pages_key] = (page_bytes, find_blank_pages(page_bytes))
+    page_bytes, blank_page_numbers = st.session_state.prepared_pages[pages_key]
+    kept_page_numbers = [n for n in range(1, len(page_bytes) + 1) if n not in blank_page_numbers]
+    if blank_page_numbers:
+        st.write(f"**Skipping blank pages:** {blank_page_numbers}")
+
+    resized_images = build_image_parts([page_bytes[n - 1] for n in kept_page_numbers], fmt="JPEG")  # List of resized image parts
 else:
-    images_b64 = []
+    page_bytes = []
 
 
-# === Batch send to Gemini ===
-results = []
-if uploaded_file:
-    st.info("🤖 Sending images to Gemini …")
-    output_json_filename = f"{pdf_name}-{model_name}_output.json"
-    json_path = os.path.join(folder_path, output_json_filename)
-    
-    # Start time tracking for total OCR process
-    start_time = time.time()
-    
-    # Send images in batch (all resized images at once)
-    if resized_images:
-        try:
-            # Resize all images before sending them to Gemini (resize step already done above)
-            resized_images_objs = resized_images  # List of resized images
-            
-            # Send all images in a batch to Gemini
-            response = model.generate_content([PROMPT] + resized_images_objs)  # Batch processing
-            
-            # Capture time after batch processing
-            end_time = time.time()
-            total_processing_time = end_time - start_time
-            st.write(f"Raw Response from Gemini: {response.text}")
-
-            # Process the response
-            raw = response.text.strip()
-            cleaned = raw.strip('```json').strip('```').strip()
-            parsed = json.loads(cleaned)
-            results.extend(parsed)
-        except Exception as e:
-            st.warning(f"❌ Failed to process images: {e}")
-    else:
-        st.warning("❌ No images to process!")
-
-    if json_path and results:
-        with open(json_path, "w") as f:
-            json.dump(results, f, indent=3)
-
-    # End time tracking for total OCR process
-    st.info(f"Total processing time: {total_processing_time:.2f} seconds")
-
-    # Save the timings in a text file
-    time_log_path = os.path.join(folder_path, f"{model_name}_timing.txt")
-    with open(time_log_path, "w") as log_file:
-        log_file.write(f"Total time taken for OCR: {total_processing_time:.2f} seconds\n")
-
 # Display Resized Image in Streamlit
 BOX_HEIGHT = 1000  # fixed height for the image display
 
+status_area = st.container()  # messages from the Gemini step, kept above the columns
 col1, col2 = st.columns(2)
 
 # ---------- Column 1 (with nav buttons and dropdown) ----------
@@ -219,16 +136,16 @@ with col1:
     if not uploaded_file:
         st.info("📂 Please upload a PDF to see the preview here.")
     else:
-        if images_b64:
+        if page_bytes:
             # Navigation buttons for pages
             nav1, nav2, nav3 = st.columns([1, 2, 1])
             with nav1:
                 if st.button("⬅️ Previous", key="prev_btn") and st.session_state.current_page > 0:
                     st.session_state.current_page -= 1
             with nav2:
-                st.markdown(f"**Page {st.session_state.current_page + 1} of {len(images_b64)}**")
+                st.markdown(f"**Page {st.session_state.current_page + 1} of {len(page_bytes)}**")
             with nav3:
-                if st.button("Next ➡️", key="next_btn") and st.session_state.current_page < len(images_b64) - 1:
+                if st.button("Next ➡️", key="next_btn") and st.session_state.current_page < len(page_bytes) - 1:
                     st.session_state.current_page += 1
 
             # Set the path to the resized image for the current page
@@ -242,12 +159,9 @@ with col1:
         else:
             st.warning("❌ No images available")
 
-# ---------- Column 2 (JSON Output) ----------
-with col2:
-    st.subheader("🧠 Extracted JSON")
-
-    # Display extracted JSON data for the batch processed images
-    json_str = json.dumps(results, indent=2)
+# ---------- Column 2 (JSON Output, filled in live while Gemini streams) ----------
+def show_json(panel, items):
+    json_str = json.dumps(items, indent=2)
     box_html = f"""
     <div style="
         height: {BOX_HEIGHT}px;
@@ -262,4 +176,96 @@ with col2:
       <pre style="margin:0;">{json_str}</pre>
     </div>
     """
-    components.html(box_html, height=BOX_HEIGHT)
+    with panel.container():
+        components.html(box_html, height=BOX_HEIGHT)
+
+with col2:
+    st.subheader("🧠 Extracted JSON")
+    json_panel = st.empty()
+
+
+# === Batch send to Gemini ===
+results = []
+if uploaded_file:
+    status_area.info("🤖 Sending images to Gemini …")
+    output_json_filename = f"{pdf_name}-{model_name}_output.json"
+    json_path = os.path.join(folder_path, output_json_filename)
+    
+    total_processing_time = 0.0
+    first_question_time = None
+    run_usage = []  # per-model tokens / latency of this run's requests (cache hits don't call the model)
+    
+    # Send images in overlapping page windows, concurrently and streamed; questions show up as soon as they
+    # are complete, the per-window answers are merged once every window is done.
+    # The merged run is kept in the session, so page navigation reruns never call Gemini again (whatever the
+    # response cache mode, and also for windows that failed) - a new upload, model or prompt streams anew
+    windows = page_windows(kept_page_numbers, pages_per_request, window_overlap)
+    run_key = (pdf_sha, model_name, prompt_version(PROMPT), tuple(tuple(window) for window in windows))
+    if resized_images and run_key in st.session_state.ocr_runs:
+        run = st.session_state.ocr_runs[run_key]
+        total_processing_time, first_question_time, run_usage = (
+            run["total_processing_time"], run["first_question_time"], run["run_usage"])
+        if run["failed_windows"]:
+            status_area.warning(f"❌ No valid JSON for page windows: {run['failed_windows']}")
+        results.extend(run["parsed"])
+    elif resized_images:
+        try:
+            parts_by_page = dict(zip(kept_page_numbers, resized_images))
+            window_results, live_results = [], []
+            start_time = time.time()
+            for event in stream_window_questions(model, PROMPT, windows, parts_by_page,
+                                                 generation_config=structured_output_config):
+                if event[0] == "question":
+                    _, window, item = event
+                    if first_question_time is None:
+                        first_question_time = time.time() - start_time
+                    live_results.extend(remap_pages([item], window))
+                    show_json(json_panel, live_results)
+                elif event[0] == "error":
+                    status_area.warning(f"❌ Failed to process pages {event[1]}: {event[2]}")
+                else:
+                    window = event[1]
+                    window_results.append(window)
+                    status_area.write(f"Raw Response from Gemini (pages {window['pages']}): {window['text']}")
+            total_processing_time = time.time() - start_time
+            # from this run's own responses - the process-wide usage log also holds other sessions' calls
+            run_usage = summarize_usage([{"model": model_name, "seconds": window["seconds"], "error": window["error"],
+                                          "pages": len(window["pages"]), **window["usage"]}
+                                         for window in window_results if window["usage"]], group_by=("model",))
+
+            # Window page numbers are mapped back to PDF pages inside the merge
+            parsed, failed_windows = merge_window_results(window_results)
+            if failed_windows:
+                status_area.warning(f"❌ No valid JSON for page windows: {failed_windows}")
+            results.extend(parsed)
+            st.session_state.ocr_runs[run_key] = {
+                "parsed": parsed, "failed_windows": failed_windows, "total_processing_time": total_processing_time,
+                "first_question_time": first_question_time, "run_usage": run_usage}
+        except Exception as e:
+            status_area.warning(f"❌ Failed to process images: {e}")
+    else:
+        status_area.warning("❌ No images to process!")
+    results.extend(blank_page_records(blank_page_numbers))
+
+    if json_path and results:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=3)
+
+    # End time tracking for total OCR process
+    if first_question_time is not None:
+        status_area.info(f"Time to first question: {first_question_time:.2f} seconds")
+    status_area.info(f"Total processing time: {total_processing_time:.2f} seconds")
+
+    # Save the timings in a text file
+    time_log_path = os.path.join(folder_path, f"{model_name}_timing.txt")
+    with open(time_log_path, "w") as log_file:
+        if first_question_time is not None:
+            log_file.write(f"Time to first question: {first_question_time:.2f} seconds\n")
+        log_file.write(f"Total time taken for OCR: {total_processing_time:.2f} seconds\n")
+        for usage in run_usage:
+            log_file.write(f"{usage['model']}: {usage['calls']} requests, {usage['prompt_tokens']} prompt + "
+                           f"{usage['candidates_tokens']} candidate tokens, {usage['tokens_per_page']} tokens/page, "
+                           f"p95 {usage['p95_seconds']} s\n")
+
+# Display the (merged) extracted JSON
+show_json(json_panel, results)
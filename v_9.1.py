@@ -1,18 +1,19 @@
 #here i am sending one image to gemnin after resizing it, not sending pdf
 import os
 from PIL import Image
+from image_preprocessing import resize_image
+from response_cache import cached_generate
+from response_parsing import parse_json_list
 import json
 import google.generativeai as genai
+from model_pool import get_model
 from dotenv import load_dotenv
 import base64
-import numpy as np
-import cv2
 
 # === Load API Key ===
 load_dotenv()
 model_name = "gemini-2.5-pro"
-genai.configure(api_key=os.getenv("GOOGLE_GEMINI_API"))
-model = genai.GenerativeModel(model_name)
+model = get_model(model_name)  # shared client, genai.configure runs once
 
 # === Prompt for Gemini ===
 PROMPT = """
@@ -22,25 +23,6 @@ Return bounding boxes as JSON arrays [ymin, xmin, ymax, xmax] on all texts
 # === Set the dimension value ===
 dim = 768  # Define the dimension value
 
-# === Resize Image Function ===
-def resize_image(image, dim=dim, save_path=None):
-    image1 = np.array(image.convert('RGB'))  # Ensure the image is in RGB mode
-    original_size = image1.shape  # (height, width, channels)
-    image1 = image1.mean(axis=2)  # Convert image to grayscale
-    h, w = image1.shape
-    if w > h:
-        new_w = dim
-        new_h = int(h * (dim / w))
-    else:
-        new_h = dim
-        new_w = int(w * (dim / h))
-    resized_image = cv2.resize(image1, (new_w, new_h), interpolation=cv2.INTER_AREA)
-    resized_image_pil = Image.fromarray(resized_image)
-    resized_image_pil = resized_image_pil.convert('RGB')  # Convert to RGB before saving
-    if save_path:
-        resized_image_pil.save(save_path)
-    return original_size, (new_h, new_w), resized_image_pil
-
 # === Load Image and Convert to Base64 ===
 def load_base64_image(image_path):
     with open(image_path, "rb") as f:
@@ -50,15 +32,16 @@ def load_base64_image(image_path):
 def send_to_gemini(resized_image_b64):
     try:
         # Send request to Gemini
-        response = model.generate_content([PROMPT, resized_image_b64])  # Batch processing
+        response = cached_generate(model, [PROMPT, resized_image_b64])  # Batch processing
         raw_response = response.text.strip()
         
         # Print raw response for debugging
         print(f"Raw response from Gemini:\n{raw_response}")
 
-        # Clean and parse JSON response
-        cleaned = raw_response.strip('```json').strip('```').strip()
-        parsed = json.loads(cleaned)
+        # Parse the JSON list (fences stripped as prefix/suffix, complete objects salvaged from a truncated response)
+        parsed = parse_json_list(raw_response)
+        if parsed is None:
+            print(f"❌ Malformed JSON: {raw_response}")
         return parsed
     except Exception as e:
         print(f"❌ Failed to process image: {e}")